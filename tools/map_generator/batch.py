@@ -0,0 +1,202 @@
+"""
+Headless batch map generation.
+Generates N maps over a seed range with the MapGenerator algorithms across a
+process pool, writing each map as soon as it is finished.
+
+    python batch.py --preset Caves --count 200 --width 128 --height 128 --out maps/
+    python batch.py --algorithm wfc --roles roles.json --seeds 100:164 --workers 16
+    python batch.py --algorithm wfc --chunk-size 128 --width 10000 --height 10000 --count 1
+
+With --chunk-size, WFC maps are solved chunk by chunk straight into a binary
+container on disk, so map size is bounded by disk space rather than memory.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mapgen.binmap import create_binary
+from mapgen.core import PRESETS, GameMap, MapGenerator, TileSet, Exporter
+
+ALGORITHMS = {
+    "bsp": MapGenerator.bsp_dungeon,
+    "cellular": MapGenerator.cellular_automata,
+    "grid": MapGenerator.grid_city,
+    "wfc": MapGenerator.wfc,
+}
+EXPORTERS = {
+    "json": (".json", Exporter.to_json),
+    "compact": (".json", Exporter.to_compact_json),
+    "binary": (".flmap", Exporter.to_binary),
+    "tscn": (".tscn", Exporter.to_tscn),
+}
+
+# Per-process state set up once by _init_worker
+_config = None
+_tileset = None
+
+
+def parse_seeds(spec: str) -> range:
+    """'START:STOP' (stop exclusive) or a single seed."""
+    if ":" in spec:
+        start, stop = spec.split(":", 1)
+        return range(int(start), int(stop))
+    return range(int(spec), int(spec) + 1)
+
+
+def parse_param(text: str) -> tuple[str, object]:
+    """'name=value' with value parsed as JSON when possible."""
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def load_roles(path: str | None) -> list[str]:
+    """Tile roles from a JSON list of names, or floor/wall when no file is given."""
+    if not path:
+        return ["floor", "wall"]
+    with open(path, "r") as f:
+        roles = json.load(f)
+    if isinstance(roles, dict):
+        roles = [roles[k] for k in sorted(roles, key=int)]
+    return roles
+
+
+def load_relations(path: str | None) -> dict | None:
+    """Relations as saved from the web app: tile -> direction -> {allowed, forbidden}."""
+    if not path:
+        return None
+    with open(path, "r") as f:
+        raw = json.load(f)
+    return {int(tile): {d: {"allowed": set(rel.get("allowed", [])), "forbidden": set(rel.get("forbidden", []))}
+                        for d, rel in dirs.items()}
+            for tile, dirs in raw.items()}
+
+
+def _init_worker(config: dict) -> None:
+    global _config, _tileset
+    _config = config
+    _tileset = TileSet()
+    _tileset.tile_roles = list(config["roles"])
+    _tileset.tile_weights = [1.0] * len(_tileset.tile_roles)
+    _tileset.tile_width = _tileset.tile_height = config["tile_size"]
+    _tileset.path = config["tileset_path"]
+
+
+def _generate_chunked(seed: int) -> str:
+    """Solve one WFC map chunk by chunk into a binary container; returns its path."""
+    path = os.path.join(_config["out"], f"{_config['name']}_{seed}.flmap")
+    tmp = f"{path}.tmp"
+    container = create_binary(tmp, _config["width"], _config["height"],
+                              tile_width=_tileset.tile_width, tile_height=_tileset.tile_height,
+                              tileset_path=os.path.basename(_tileset.path))
+    try:
+        with container:
+            game_map = GameMap.from_arrays(container.tiles, container.roles)
+            MapGenerator.wfc_chunked(game_map, _tileset, tile_relations=_config["relations"], seed=seed,
+                                     chunk_size=_config["chunk_size"], **_config["params"])
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def _generate_one(seed: int) -> tuple[int, str, float]:
+    """Generate and export one map; returns (seed, output path, seconds)."""
+    start = time.perf_counter()
+    if _config["chunk_size"]:
+        return seed, _generate_chunked(seed), time.perf_counter() - start
+    game_map = GameMap(_config["width"], _config["height"])
+    params = dict(_config["params"])
+    if _config["algorithm"] == "wfc":
+        params["tile_relations"] = _config["relations"]
+    ALGORITHMS[_config["algorithm"]](game_map, _tileset, seed=seed, **params)
+
+    ext, export = EXPORTERS[_config["format"]]
+    path = os.path.join(_config["out"], f"{_config['name']}_{seed}{ext}")
+    export(game_map, _tileset, path)
+    return seed, path, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate many maps in parallel.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--preset", choices=list(PRESETS), help="Named preset (default: Sewer)")
+    source.add_argument("--algorithm", choices=list(ALGORITHMS), help="Algorithm to run with --param values")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Algorithm parameter, repeatable; overrides preset values")
+    parser.add_argument("--width", type=int, default=40)
+    parser.add_argument("--height", type=int, default=25)
+    parser.add_argument("--seeds", default=None, help="Seed range START:STOP (stop exclusive)")
+    parser.add_argument("--count", type=int, default=10, help="Number of maps when --seeds is not given")
+    parser.add_argument("--seed-start", type=int, default=0)
+    parser.add_argument("--roles", help="JSON list of tile role names, one per tile")
+    parser.add_argument("--relations", help="JSON relations for wfc (default: same-role tiles touch)")
+    parser.add_argument("--tileset", default="", help="Tileset path recorded in exported maps")
+    parser.add_argument("--tile-size", type=int, default=16)
+    parser.add_argument("--format", choices=list(EXPORTERS), help="Output format (default: json, binary with --chunk-size)")
+    parser.add_argument("--chunk-size", type=int, default=0,
+                        help="Solve wfc in chunks of this size straight into a binary container")
+    parser.add_argument("--out", default="maps")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.algorithm:
+        name, algorithm, params = args.algorithm, args.algorithm, {}
+    else:
+        name = args.preset or "Sewer"
+        algorithm, params = PRESETS[name]["algorithm"], dict(PRESETS[name]["params"])
+    params.update(parse_param(p) for p in args.param)
+    if args.chunk_size:
+        if algorithm != "wfc":
+            parser.error("--chunk-size needs --algorithm wfc")
+        if args.format not in (None, "binary"):
+            parser.error("--chunk-size writes binary containers; use --format binary")
+    fmt = args.format or ("binary" if args.chunk_size else "json")
+    seeds = parse_seeds(args.seeds) if args.seeds else range(args.seed_start, args.seed_start + args.count)
+
+    os.makedirs(args.out, exist_ok=True)
+    config = {
+        "name": name.lower(),
+        "algorithm": algorithm,
+        "params": params,
+        "width": args.width,
+        "height": args.height,
+        "roles": load_roles(args.roles),
+        "relations": load_relations(args.relations),
+        "tile_size": args.tile_size,
+        "tileset_path": args.tileset,
+        "format": fmt,
+        "chunk_size": args.chunk_size,
+        "out": args.out,
+    }
+
+    print(f"Generating {len(seeds)} {name} maps ({args.width}x{args.height}) on {args.workers} workers...")
+    start = time.perf_counter()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(config,)) as pool:
+        futures = {pool.submit(_generate_one, seed): seed for seed in seeds}
+        for future in as_completed(futures):
+            try:
+                seed, path, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  seed {futures[future]}: FAILED ({e})", file=sys.stderr)
+                continue
+            done += 1
+            print(f"  [{done}/{len(seeds)}] seed {seed} -> {path} ({elapsed * 1000:.0f} ms)")
+
+    total = time.perf_counter() - start
+    rate = done / total if total > 0 else 0.0
+    print(f"Done: {done} maps in {total:.2f}s ({rate:.1f} maps/sec)" + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,257 +8,19 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk, ImageDraw
 import numpy as np
-import json
 import os
 
+from mapgen.cache import GenerationCache
+from mapgen.core import TileSet, GameMap, MapGenerator, PRESETS, Exporter
+from mapgen.roles import TILE_ROLES, ROLE_COLORS, ROLE_COLOR_LUT, role_code
+
 # =============================================================================
 # CONSTANTS
 # =============================================================================
 
 WINDOW_TITLE = "Flatline Protocol - Map Generator"
-TILE_ROLES = ["empty", "floor", "wall", "decoration", "water", "door", "spawn", "exit"]
-ROLE_COLORS = {
-    "empty": (51, 51, 51),
-    "floor": (139, 115, 85),
-    "wall": (74, 74, 74),
-    "decoration": (107, 142, 35),
-    "water": (70, 130, 180),
-    "door": (205, 133, 63),
-    "spawn": (50, 205, 50),
-    "exit": (255, 69, 0)
-}
-
-# =============================================================================
-# DATA CLASSES
-# =============================================================================
-
-class TileSet:
-    """Manages the loaded tileset."""
-    def __init__(self):
-        self.image: Image.Image = None
-        self.tile_images: list[Image.Image] = []
-        self.tile_roles: list[str] = []
-        self.tile_width = 16
-        self.tile_height = 16
-        self.path = ""
-        
-    def load(self, path: str, tile_w: int, tile_h: int):
-        """Load tileset and split into tiles."""
-        self.image = Image.open(path).convert("RGBA")
-        self.path = path
-        self.tile_width = tile_w
-        self.tile_height = tile_h
-        self.tile_images.clear()
-        self.tile_roles.clear()
-        
-        cols = self.image.width // tile_w
-        rows = self.image.height // tile_h
-        
-        for row in range(rows):
-            for col in range(cols):
-                x = col * tile_w
-                y = row * tile_h
-                tile_img = self.image.crop((x, y, x + tile_w, y + tile_h))
-                self.tile_images.append(tile_img)
-                self.tile_roles.append("empty")
-                
-        return len(self.tile_images)
-
-
-class GameMap:
-    """Represents the generated map."""
-    def __init__(self, width: int = 40, height: int = 25):
-        self.width = width
-        self.height = height
-        self.data = np.zeros((height, width), dtype=int)
-        self.roles = np.full((height, width), "empty", dtype=object)
-        
-    def resize(self, width: int, height: int):
-        """Resize the map."""
-        new_data = np.zeros((height, width), dtype=int)
-        new_roles = np.full((height, width), "empty", dtype=object)
-        
-        min_h = min(height, self.height)
-        min_w = min(width, self.width)
-        new_data[:min_h, :min_w] = self.data[:min_h, :min_w]
-        new_roles[:min_h, :min_w] = self.roles[:min_h, :min_w]
-        
-        self.data = new_data
-        self.roles = new_roles
-        self.width = width
-        self.height = height
-
-
-# =============================================================================
-# GENERATION ALGORITHMS
-# =============================================================================
-
-class MapGenerator:
-    
-    @staticmethod
-    def get_tiles_by_role(tileset: TileSet, role: str) -> list[int]:
-        return [i for i, r in enumerate(tileset.tile_roles) if r == role]
-    
-    @staticmethod
-    def bsp_dungeon(game_map: GameMap, tileset: TileSet, 
-                    min_room_size: int = 5, max_room_size: int = 10,
-                    corridor_width: int = 2) -> None:
-        import random
-        
-        floor_tiles = MapGenerator.get_tiles_by_role(tileset, "floor") or [0]
-        wall_tiles = MapGenerator.get_tiles_by_role(tileset, "wall") or ([1] if len(tileset.tile_images) > 1 else [0])
-        
-        # Fill with walls
-        game_map.data.fill(random.choice(wall_tiles))
-        game_map.roles.fill("wall")
-        
-        rooms = []
-        
-        def split_space(x, y, w, h, depth=0):
-            if depth > 4 or w < min_room_size * 2 or h < min_room_size * 2:
-                room_w = random.randint(min_room_size, min(max_room_size, w - 2))
-                room_h = random.randint(min_room_size, min(max_room_size, h - 2))
-                room_x = x + random.randint(1, max(1, w - room_w - 1))
-                room_y = y + random.randint(1, max(1, h - room_h - 1))
-                rooms.append((room_x, room_y, room_w, room_h))
-                return
-            
-            if random.random() > 0.5 and w > min_room_size * 2:
-                split = random.randint(w // 3, 2 * w // 3)
-                split_space(x, y, split, h, depth + 1)
-                split_space(x + split, y, w - split, h, depth + 1)
-            elif h > min_room_size * 2:
-                split = random.randint(h // 3, 2 * h // 3)
-                split_space(x, y, w, split, depth + 1)
-                split_space(x, y + split, w, h - split, depth + 1)
-        
-        split_space(0, 0, game_map.width, game_map.height)
-        
-        # Carve rooms
-        for rx, ry, rw, rh in rooms:
-            for py in range(ry, min(ry + rh, game_map.height)):
-                for px in range(rx, min(rx + rw, game_map.width)):
-                    game_map.data[py, px] = random.choice(floor_tiles)
-                    game_map.roles[py, px] = "floor"
-        
-        # Connect rooms
-        for i in range(len(rooms) - 1):
-            r1, r2 = rooms[i], rooms[i + 1]
-            cx1, cy1 = r1[0] + r1[2] // 2, r1[1] + r1[3] // 2
-            cx2, cy2 = r2[0] + r2[2] // 2, r2[1] + r2[3] // 2
-            
-            for x in range(min(cx1, cx2), max(cx1, cx2) + 1):
-                for w in range(corridor_width):
-                    if 0 <= cy1 + w < game_map.height and 0 <= x < game_map.width:
-                        game_map.data[cy1 + w, x] = random.choice(floor_tiles)
-                        game_map.roles[cy1 + w, x] = "floor"
-            
-            for y in range(min(cy1, cy2), max(cy1, cy2) + 1):
-                for w in range(corridor_width):
-                    if 0 <= cx2 + w < game_map.width and 0 <= y < game_map.height:
-                        game_map.data[y, cx2 + w] = random.choice(floor_tiles)
-                        game_map.roles[y, cx2 + w] = "floor"
-    
-    @staticmethod
-    def cellular_automata(game_map: GameMap, tileset: TileSet,
-                          fill_chance: float = 0.45, iterations: int = 5) -> None:
-        import random
-        
-        floor_tiles = MapGenerator.get_tiles_by_role(tileset, "floor") or [0]
-        wall_tiles = MapGenerator.get_tiles_by_role(tileset, "wall") or ([1] if len(tileset.tile_images) > 1 else [0])
-        
-        for y in range(game_map.height):
-            for x in range(game_map.width):
-                if x == 0 or y == 0 or x == game_map.width - 1 or y == game_map.height - 1:
-                    game_map.roles[y, x] = "wall"
-                elif random.random() < fill_chance:
-                    game_map.roles[y, x] = "wall"
-                else:
-                    game_map.roles[y, x] = "floor"
-        
-        for _ in range(iterations):
-            new_roles = game_map.roles.copy()
-            for y in range(1, game_map.height - 1):
-                for x in range(1, game_map.width - 1):
-                    walls = sum(1 for dy in [-1, 0, 1] for dx in [-1, 0, 1]
-                                if game_map.roles[y + dy, x + dx] == "wall")
-                    new_roles[y, x] = "wall" if walls > 4 else "floor"
-            game_map.roles = new_roles
-        
-        for y in range(game_map.height):
-            for x in range(game_map.width):
-                if game_map.roles[y, x] == "wall":
-                    game_map.data[y, x] = random.choice(wall_tiles)
-                else:
-                    game_map.data[y, x] = random.choice(floor_tiles)
-    
-    @staticmethod
-    def grid_city(game_map: GameMap, tileset: TileSet,
-                  block_size: int = 8, street_width: int = 2) -> None:
-        import random
-        
-        floor_tiles = MapGenerator.get_tiles_by_role(tileset, "floor") or [0]
-        wall_tiles = MapGenerator.get_tiles_by_role(tileset, "wall") or ([1] if len(tileset.tile_images) > 1 else [0])
-        
-        for y in range(game_map.height):
-            for x in range(game_map.width):
-                game_map.data[y, x] = random.choice(floor_tiles)
-                game_map.roles[y, x] = "floor"
-        
-        period = block_size + street_width
-        for by in range(0, game_map.height, period):
-            for bx in range(0, game_map.width, period):
-                bw = random.randint(block_size - 2, block_size)
-                bh = random.randint(block_size - 2, block_size)
-                
-                for y in range(by, min(by + bh, game_map.height)):
-                    for x in range(bx, min(bx + bw, game_map.width)):
-                        game_map.data[y, x] = random.choice(wall_tiles)
-                        game_map.roles[y, x] = "wall"
-
-
-# =============================================================================
-# PRESETS
-# =============================================================================
-
-PRESETS = {
-    "Sewer": {"algorithm": "bsp", "params": {"min_room_size": 4, "max_room_size": 8, "corridor_width": 2}},
-    "Urban": {"algorithm": "grid", "params": {"block_size": 10, "street_width": 3}},
-    "Office": {"algorithm": "bsp", "params": {"min_room_size": 6, "max_room_size": 12, "corridor_width": 2}},
-    "Caves": {"algorithm": "cellular", "params": {"fill_chance": 0.48, "iterations": 6}}
-}
-
-
-# =============================================================================
-# EXPORT
-# =============================================================================
-
-class Exporter:
-    @staticmethod
-    def to_json(game_map: GameMap, tileset: TileSet, path: str) -> None:
-        data = {
-            "width": game_map.width,
-            "height": game_map.height,
-            "tile_width": tileset.tile_width,
-            "tile_height": tileset.tile_height,
-            "tileset_path": os.path.basename(tileset.path),
-            "tiles": game_map.data.tolist(),
-            "roles": game_map.roles.tolist()
-        }
-        with open(path, 'w') as f:
-            json.dump(data, f, indent=2)
-    
-    @staticmethod
-    def to_tscn(game_map: GameMap, tileset: TileSet, path: str) -> None:
-        tscn = '''[gd_scene load_steps=2 format=3]
-[ext_resource type="TileSet" path="res://tileset.tres" id="1"]
-[node name="GeneratedMap" type="TileMapLayer"]
-tile_set = ExtResource("1")
-'''
-        with open(path, 'w') as f:
-            f.write(tscn)
-        Exporter.to_json(game_map, tileset, path.replace('.tscn', '_data.json'))
-
+MAP_CELL = 10        # Preview pixels per map cell
+FRAME_MS = 16        # Painting refreshes are coalesced to one per frame
 
 # =============================================================================
 # MAIN APPLICATION
@@ -273,11 +35,16 @@ class MapGeneratorApp:
         self.tileset = TileSet()
         self.game_map = GameMap(40, 25)
         self.selected_tile = 0
+        self.generation_cache = GenerationCache(spill_dir=os.environ.get("MAPGEN_CACHE_DIR"))
         
         # Image references (to prevent garbage collection)
         self.tileset_photo = None
         self.map_photo = None
         
+        # Cells painted since the last refresh, flushed once per frame
+        self._dirty_cells: set[tuple[int, int]] = set()
+        self._refresh_pending = None
+        
         self._setup_ui()
         
     def _setup_ui(self):
@@ -343,6 +110,11 @@ class MapGeneratorApp:
         
         self.preset_var = tk.StringVar(value="Sewer")
         ttk.Combobox(gen_frame, textvariable=self.preset_var, values=list(PRESETS.keys()), width=12).pack()
+        seed_row = ttk.Frame(gen_frame)
+        seed_row.pack(pady=(5, 0))
+        ttk.Label(seed_row, text="Seed:").pack(side=tk.LEFT)
+        self.seed_var = tk.StringVar(value="")  # blank = random
+        ttk.Entry(seed_row, textvariable=self.seed_var, width=10).pack(side=tk.LEFT)
         ttk.Button(gen_frame, text="Generate", command=self._generate).pack(pady=5)
         
         # Export
@@ -350,7 +122,8 @@ class MapGeneratorApp:
         exp_frame.pack(fill=tk.X, pady=5)
         
         ttk.Button(exp_frame, text="Export JSON", command=self._export_json).pack(fill=tk.X)
-        ttk.Button(exp_frame, text="Export TSCN", command=self._export_tscn).pack(fill=tk.X, pady=2)
+        ttk.Button(exp_frame, text="Export Compact JSON", command=self._export_compact).pack(fill=tk.X, pady=2)
+        ttk.Button(exp_frame, text="Export TSCN", command=self._export_tscn).pack(fill=tk.X)
         
         # Status
         self.status_var = tk.StringVar(value="Ready")
@@ -381,7 +154,7 @@ class MapGeneratorApp:
         grid = Image.new("RGB", (cols * cell, rows * cell), (30, 30, 30))
         draw = ImageDraw.Draw(grid)
         
-        for i, img in enumerate(self.tileset.tile_images):
+        for i in range(len(self.tileset.tile_images)):
             r, c = i // cols, i % cols
             x, y = c * cell, r * cell
             
@@ -391,8 +164,9 @@ class MapGeneratorApp:
             draw.rectangle([x, y, x + cell - 1, y + cell - 1], fill=color)
             
             # Paste tile
-            resized = img.resize((cell - 2, cell - 2), Image.Resampling.NEAREST)
-            grid.paste(resized, (x + 1, y + 1), resized if resized.mode == 'RGBA' else None)
+            pixels = self.tileset.render_cache.get(self.tileset.tile_images, i, (cell - 2, cell - 2))
+            resized = Image.fromarray(pixels, "RGBA")
+            grid.paste(resized, (x + 1, y + 1), resized)
         
         self.tileset_photo = ImageTk.PhotoImage(grid)
         self.tileset_label.configure(image=self.tileset_photo, text="")
@@ -423,48 +197,85 @@ class MapGeneratorApp:
             return
         
         preset = PRESETS.get(self.preset_var.get(), PRESETS["Sewer"])
-        
-        if preset["algorithm"] == "bsp":
-            MapGenerator.bsp_dungeon(self.game_map, self.tileset, **preset["params"])
-        elif preset["algorithm"] == "cellular":
-            MapGenerator.cellular_automata(self.game_map, self.tileset, **preset["params"])
-        elif preset["algorithm"] == "grid":
-            MapGenerator.grid_city(self.game_map, self.tileset, **preset["params"])
+        try:
+            seed = int(self.seed_var.get())
+        except ValueError:
+            seed = int(np.random.default_rng().integers(2**31))
+        
+        key = GenerationCache.key(preset["algorithm"], preset["params"], self.game_map.width,
+                                  self.game_map.height, seed, self.tileset.fingerprint())
+        cached = self.generation_cache.get(key)
+        if cached is not None:
+            arrays, _ = cached
+            self.game_map.data[...] = arrays["data"]
+            self.game_map.roles[...] = arrays["roles"]
+        else:
+            if preset["algorithm"] == "bsp":
+                MapGenerator.bsp_dungeon(self.game_map, self.tileset, **preset["params"], seed=seed)
+            elif preset["algorithm"] == "cellular":
+                MapGenerator.cellular_automata(self.game_map, self.tileset, **preset["params"], seed=seed)
+            elif preset["algorithm"] == "grid":
+                MapGenerator.grid_city(self.game_map, self.tileset, **preset["params"], seed=seed)
+            self.generation_cache.put(key, {"data": self.game_map.data, "roles": self.game_map.roles})
         
         self._display_map()
-        self.status_var.set(f"Generated {self.preset_var.get()} map")
+        self.status_var.set(f"Generated {self.preset_var.get()} map (seed {seed})"
+                            + (" [cached]" if cached is not None else ""))
     
     def _display_map(self):
-        cell = 10
-        w = self.game_map.width * cell
-        h = self.game_map.height * cell
-        
-        img = Image.new("RGB", (w, h), (40, 40, 40))
-        draw = ImageDraw.Draw(img)
+        """Full redraw: rebuild the backing photo image from the role layer."""
+        cell = MAP_CELL
         
-        for y in range(self.game_map.height):
-            for x in range(self.game_map.width):
-                role = self.game_map.roles[y, x]
-                color = ROLE_COLORS.get(role, (51, 51, 51))
-                px, py = x * cell, y * cell
-                draw.rectangle([px, py, px + cell - 1, py + cell - 1], fill=color)
+        # Role codes index straight into the colour table, then each cell is
+        # scaled up to cell x cell pixels
+        rgb = ROLE_COLOR_LUT[self.game_map.roles]
+        rgb = rgb.repeat(cell, axis=0).repeat(cell, axis=1)
+        img = Image.fromarray(rgb, "RGB")
         
+        self._cancel_refresh()
+        self._dirty_cells.clear()
         self.map_photo = ImageTk.PhotoImage(img)
         self.map_label.configure(image=self.map_photo, text="")
     
+    def _refresh_dirty_cells(self):
+        """Incremental redraw: repaint only the cells touched since the last frame."""
+        self._refresh_pending = None
+        if not self._dirty_cells:
+            return
+        if self.map_photo is None or len(self._dirty_cells) * 4 > self.game_map.width * self.game_map.height:
+            self._display_map()
+            return
+        
+        cell = MAP_CELL
+        photo = str(self.map_photo)
+        for x, y in self._dirty_cells:
+            r, g, b = ROLE_COLOR_LUT[self.game_map.roles[y, x]]
+            px, py = x * cell, y * cell
+            # Fill the cell directly in the Tk photo backing store
+            self.root.tk.call(photo, "put", f"#{r:02x}{g:02x}{b:02x}",
+                              "-to", px, py, px + cell, py + cell)
+        self._dirty_cells.clear()
+    
+    def _cancel_refresh(self):
+        if self._refresh_pending is not None:
+            self.root.after_cancel(self._refresh_pending)
+            self._refresh_pending = None
+    
     def _on_map_click(self, event):
         if not self.tileset.tile_images:
             return
         
-        cell = 10
+        cell = MAP_CELL
         x = event.x // cell
         y = event.y // cell
         
         if 0 <= x < self.game_map.width and 0 <= y < self.game_map.height:
             role = self.tileset.tile_roles[self.selected_tile]
             self.game_map.data[y, x] = self.selected_tile
-            self.game_map.roles[y, x] = role
-            self._display_map()
+            self.game_map.roles[y, x] = role_code(role)
+            self._dirty_cells.add((x, y))
+            if self._refresh_pending is None:
+                self._refresh_pending = self.root.after(FRAME_MS, self._refresh_dirty_cells)
     
     def _export_json(self):
         if not self.tileset.tile_images:
@@ -474,6 +285,14 @@ class MapGeneratorApp:
             Exporter.to_json(self.game_map, self.tileset, path)
             self.status_var.set(f"Saved {os.path.basename(path)}")
     
+    def _export_compact(self):
+        if not self.tileset.tile_images:
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            Exporter.to_compact_json(self.game_map, self.tileset, path, encoding="base64", compress=True)
+            self.status_var.set(f"Saved {os.path.basename(path)}")
+    
     def _export_tscn(self):
         if not self.tileset.tile_images:
             return
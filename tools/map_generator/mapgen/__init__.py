@@ -0,0 +1,39 @@
+"""
+Generation engines shared by the Tk app (main.py) and the Flask app (web_app.py).
+"""
+
+from .bsp import BSPNode, build_tree, corridor_rects, bsp_layout
+from .city import city_layout
+from .cellular import parse_rule, step_automaton, run_automaton, generate_cave_mask
+from .wfc import (DIRECTIONS, DIR_OFFSETS, Contradiction, BudgetExceeded, ChunkFailed, WFCModel, WFCSolver,
+                  compile_relations, role_compat, wfc_generate, solve, generate_chunks)
+from .painter import build_variants, paint
+from .render import build_atlas, composite
+from .cache import TileRenderCache, GenerationCache, fingerprint, relations_fingerprint
+from .mapformat import (COMPACT_FORMAT, COMPACT_VERSION, encode_layer, decode_layer,
+                        pack_map, unpack_map, dump_map, load_map)
+from .binmap import BinaryMap, open_binary, create_binary, save_binary, dump_binary, is_binary_map
+from .godot import (CELL_DTYPE, encode_tile_map_data, decode_tile_map_data,
+                    format_packed_byte_array, format_int_list)
+from .sessions import WorkspaceStore
+from .core import TileSet, GameMap, MapGenerator, PRESETS, Exporter
+from .roles import (TILE_ROLES, ROLE_COLORS, ROLE_CODES, ROLE_COLOR_LUT, ROLE_DTYPE,
+                    role_code, empty_roles, codes_from_names, names_from_codes)
+
+__all__ = [
+    "BSPNode", "build_tree", "corridor_rects", "bsp_layout", "city_layout",
+    "parse_rule", "step_automaton", "run_automaton", "generate_cave_mask",
+    "TILE_ROLES", "ROLE_COLORS", "ROLE_CODES", "ROLE_COLOR_LUT", "ROLE_DTYPE",
+    "role_code", "empty_roles", "codes_from_names", "names_from_codes",
+    "DIRECTIONS", "DIR_OFFSETS", "Contradiction", "BudgetExceeded", "ChunkFailed", "WFCModel", "WFCSolver",
+    "compile_relations", "role_compat", "wfc_generate", "solve", "generate_chunks",
+    "build_atlas", "composite", "TileRenderCache", "build_variants", "paint",
+    "GenerationCache", "fingerprint", "relations_fingerprint",
+    "COMPACT_FORMAT", "COMPACT_VERSION", "encode_layer", "decode_layer",
+    "pack_map", "unpack_map", "dump_map", "load_map",
+    "BinaryMap", "open_binary", "create_binary", "save_binary", "dump_binary", "is_binary_map",
+    "CELL_DTYPE", "encode_tile_map_data", "decode_tile_map_data",
+    "format_packed_byte_array", "format_int_list",
+    "WorkspaceStore",
+    "TileSet", "GameMap", "MapGenerator", "PRESETS", "Exporter",
+]
@@ -0,0 +1,146 @@
+"""
+Binary map container.
+A fixed header, a JSON metadata block and the raw tile (int32) and role
+(uint8) layers, laid out so both layers can be opened with np.memmap. Large
+maps can be inspected, converted or edited a region at a time without ever
+reading the whole file.
+
+    [header][metadata JSON][pad to 16][tiles <i4 H*W][roles u1 H*W]
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from .roles import ROLE_DTYPE, TILE_ROLES, codes_from_names
+
+MAGIC = b"FLMAPBIN"
+BINARY_VERSION = 1
+HEADER = struct.Struct("<8sHHIII")    # magic, version, flags, width, height, metadata length
+ALIGN = 16
+TILE_DTYPE = np.dtype("<i4")
+ROWS_PER_WRITE = 1024                 # Layers are written in row chunks to bound memory
+
+
+def _layout(width: int, height: int, meta_len: int) -> tuple[int, int]:
+    """Byte offsets of the tile and role layers."""
+    tiles = -(-(HEADER.size + meta_len) // ALIGN) * ALIGN
+    return tiles, tiles + width * height * TILE_DTYPE.itemsize
+
+
+def _header_bytes(width: int, height: int, meta: dict) -> tuple[bytes, int, int]:
+    meta = {"role_names": list(TILE_ROLES), **meta}
+    blob = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    tiles_at, roles_at = _layout(width, height, len(blob))
+    head = HEADER.pack(MAGIC, BINARY_VERSION, 0, width, height, len(blob)) + blob
+    return head.ljust(tiles_at, b"\0"), tiles_at, roles_at
+
+
+def is_binary_map(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def dump_binary(fp, tiles: np.ndarray, roles: np.ndarray, **meta) -> None:
+    """Write a container to a binary file object, streaming the layers in row chunks.
+
+    `tiles` and `roles` may themselves be memmaps or views of a larger map.
+    """
+    height, width = tiles.shape
+    head, _, _ = _header_bytes(width, height, meta)
+    fp.write(head)
+    for layer, dtype in ((tiles, TILE_DTYPE), (roles, np.dtype(ROLE_DTYPE))):
+        for r in range(0, height, ROWS_PER_WRITE):
+            fp.write(np.ascontiguousarray(layer[r:r + ROWS_PER_WRITE], dtype=dtype).tobytes())
+
+
+class BinaryMap:
+    """An open container; `tiles` and `roles` are (height, width) memmaps.
+
+    mode is "r" (read-only), "r+" (edit in place) or "c" (copy-on-write).
+    A file written with a different role table can only be opened read-only;
+    its role codes are translated by region() for just that rectangle, or for
+    the whole layer on first use of `roles`.
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        self.path = path
+        self.mode = mode
+        with open(path, "rb") as f:
+            magic, version, _, width, height, meta_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a binary map")
+            if version > BINARY_VERSION:
+                raise ValueError(f"Binary map version {version} is newer than {BINARY_VERSION}")
+            self.meta = json.loads(f.read(meta_len).decode("utf-8"))
+        self.width = width
+        self.height = height
+        tiles_at, roles_at = _layout(width, height, meta_len)
+        names = self.meta.get("role_names", TILE_ROLES)
+        # File role code -> current role code, when the file used another table
+        self.role_lut = codes_from_names(names) if list(names) != list(TILE_ROLES) else None
+        if self.role_lut is not None and mode != "r":
+            raise ValueError(f"{path} uses a different role table and can only be opened with mode 'r'")
+        self.tiles = np.memmap(path, dtype=TILE_DTYPE, mode=mode, offset=tiles_at, shape=(height, width))
+        self._roles = np.memmap(path, dtype=ROLE_DTYPE, mode=mode, offset=roles_at, shape=(height, width))
+        self._remapped = None
+
+    @property
+    def roles(self) -> np.ndarray:
+        if self.role_lut is None or self._roles is None:
+            return self._roles
+        if self._remapped is None:
+            self._remapped = self.role_lut[self._roles]
+            self._remapped.flags.writeable = False
+        return self._remapped
+
+    def region(self, x: int, y: int, width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+        """Views of the tile and role layers for a rectangle; nothing is read until used.
+
+        With a different role table the roles are a translated copy of the rectangle.
+        """
+        roles = self._roles[y:y + height, x:x + width]
+        if self.role_lut is not None:
+            roles = self.role_lut[roles]
+        return self.tiles[y:y + height, x:x + width], roles
+
+    def flush(self) -> None:
+        for layer in (self.tiles, self._roles):
+            if isinstance(layer, np.memmap) and self.mode != "r":
+                layer.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.tiles = self._roles = self._remapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"BinaryMap({self.path!r}, {self.width}x{self.height}, mode={self.mode!r})"
+
+
+def open_binary(path: str, mode: str = "r") -> BinaryMap:
+    return BinaryMap(path, mode)
+
+
+def create_binary(path: str, width: int, height: int, **meta) -> BinaryMap:
+    """Create a zero-filled (sparse where supported) container and open it for writing."""
+    head, _, roles_at = _header_bytes(width, height, meta)
+    with open(path, "wb") as f:
+        f.write(head)
+        f.truncate(roles_at + width * height)
+    return BinaryMap(path, "r+")
+
+
+def save_binary(path: str, tiles: np.ndarray, roles: np.ndarray, **meta) -> None:
+    """Write a container to `path` through a temp file and an atomic rename."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        dump_binary(f, tiles, roles, **meta)
+    os.replace(tmp, path)
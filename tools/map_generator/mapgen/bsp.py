@@ -0,0 +1,98 @@
+"""
+BSP dungeon engine.
+Builds an explicit split tree, places one room per leaf, links consecutive
+rooms with L-shaped corridors and carves everything with slice assignment.
+"""
+
+import numpy as np
+
+
+class BSPNode:
+    """A rectangle of the split tree; leaves carry a room (x, y, w, h)."""
+    __slots__ = ("x", "y", "w", "h", "depth", "split", "left", "right", "room")
+
+    def __init__(self, x: int, y: int, w: int, h: int, depth: int = 0):
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.depth = depth
+        self.split = None          # ("x" | "y", offset) for inner nodes
+        self.left = None
+        self.right = None
+        self.room = None
+
+    @property
+    def is_leaf(self) -> bool:
+        return self.left is None
+
+    def leaves(self):
+        """Leaves in left-to-right order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                yield node
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def __repr__(self) -> str:
+        kind = f"room={self.room}" if self.is_leaf else f"split={self.split}"
+        return f"BSPNode({self.x}, {self.y}, {self.w}, {self.h}, depth={self.depth}, {kind})"
+
+
+def build_tree(width: int, height: int, min_room: int = 5, max_room: int = 10,
+               max_depth: int = 4, rng: np.random.Generator | None = None) -> BSPNode:
+    """Split the map recursively (without recursion) and place a room in every leaf."""
+    rng = rng if rng is not None else np.random.default_rng()
+    root = BSPNode(0, 0, width, height)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        x, y, w, h = node.x, node.y, node.w, node.h
+        can_x = w > min_room * 2
+        can_y = h > min_room * 2
+        if node.depth <= max_depth and w >= min_room * 2 and h >= min_room * 2 and (can_x or can_y):
+            if can_x and (rng.random() > 0.5 or not can_y):
+                s = int(rng.integers(w // 3, 2 * w // 3 + 1))
+                node.split = ("x", s)
+                node.left = BSPNode(x, y, s, h, node.depth + 1)
+                node.right = BSPNode(x + s, y, w - s, h, node.depth + 1)
+            else:
+                s = int(rng.integers(h // 3, 2 * h // 3 + 1))
+                node.split = ("y", s)
+                node.left = BSPNode(x, y, w, s, node.depth + 1)
+                node.right = BSPNode(x, y + s, w, h - s, node.depth + 1)
+            stack.append(node.right)
+            stack.append(node.left)
+            continue
+        rw = int(rng.integers(min_room, max(min_room, min(max_room, w - 2)) + 1))
+        rh = int(rng.integers(min_room, max(min_room, min(max_room, h - 2)) + 1))
+        rx = x + int(rng.integers(1, max(1, w - rw - 1) + 1))
+        ry = y + int(rng.integers(1, max(1, h - rh - 1) + 1))
+        node.room = (rx, ry, rw, rh)
+    return root
+
+
+def corridor_rects(rooms: list[tuple[int, int, int, int]], corridor_width: int = 2) -> list[tuple[int, int, int, int]]:
+    """L-shaped links between consecutive room centres as (x0, y0, x1, y1) rects."""
+    rects = []
+    for (ax, ay, aw, ah), (bx, by, bw, bh) in zip(rooms, rooms[1:]):
+        cx1, cy1 = ax + aw // 2, ay + ah // 2
+        cx2, cy2 = bx + bw // 2, by + bh // 2
+        rects.append((min(cx1, cx2), cy1, max(cx1, cx2) + 1, cy1 + corridor_width))
+        rects.append((cx2, min(cy1, cy2), cx2 + corridor_width, max(cy1, cy2) + 1))
+    return rects
+
+
+def bsp_layout(width: int, height: int, min_room_size: int = 5, max_room_size: int = 10,
+               corridor_width: int = 2, max_depth: int = 4,
+               rng: np.random.Generator | None = None) -> tuple[np.ndarray, BSPNode]:
+    """Generate a (height, width) bool floor mask and the split tree behind it."""
+    tree = build_tree(width, height, min_room_size, max_room_size, max_depth, rng)
+    rooms = [leaf.room for leaf in tree.leaves()]
+    floor = np.zeros((height, width), dtype=bool)
+    # Slices clip at the far edges; all coordinates are non-negative
+    for rx, ry, rw, rh in rooms:
+        floor[ry:ry + rh, rx:rx + rw] = True
+    for x0, y0, x1, y1 in corridor_rects(rooms, corridor_width):
+        floor[y0:y1, x0:x1] = True
+    return floor, tree
@@ -0,0 +1,183 @@
+"""
+Memory-bounded LRU caches.
+TileRenderCache keeps scaled tile pixels so redraws, zoom changes and repeated
+previews stop re-scaling the whole tileset; clear() it whenever the tileset
+is reloaded or re-sliced. GenerationCache keeps generated maps keyed by
+algorithm, params, size, seed and tileset/relations fingerprint.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .render import scale_nearest, tile_pixels
+
+
+class TileRenderCache:
+    """Scaled RGBA tile pixels keyed by (tile index, (width, height), resample)."""
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+    def get(self, tiles, index: int, size: tuple[int, int], resample: str = "nearest") -> np.ndarray:
+        """Pixels of tiles[index] scaled to size as an (h, w, 4) uint8 array.
+
+        The returned array is shared with the cache; copy it before writing.
+        """
+        key = (index, size, resample)
+        pixels = self._entries.get(key)
+        if pixels is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pixels
+        self.misses += 1
+        pixels = self._scale(tiles[index], size, resample)
+        pixels.flags.writeable = False
+        self._entries[key] = pixels
+        self.nbytes += pixels.nbytes
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return pixels
+
+    @staticmethod
+    def _scale(tile, size: tuple[int, int], resample: str) -> np.ndarray:
+        width, height = size
+        if resample == "nearest":
+            return np.ascontiguousarray(scale_nearest(tile_pixels(tile), width, height))
+        from PIL import Image
+        if isinstance(tile, np.ndarray):
+            tile = Image.fromarray(tile_pixels(tile), "RGBA")
+        mode = getattr(Image.Resampling, resample.upper())
+        return tile_pixels(tile.resize((width, height), mode))
+
+
+def fingerprint(*parts) -> str:
+    """Stable short hash of JSON-serialisable parts (sets are sorted)."""
+    def default(obj):
+        if isinstance(obj, (set, frozenset)):
+            return sorted(obj)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Cannot fingerprint {type(obj).__name__}")
+    blob = json.dumps(parts, sort_keys=True, default=default, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def relations_fingerprint(tile_relations) -> str:
+    """Fingerprint of tile -> direction -> {allowed, forbidden}, ignoring empty entries."""
+    entries = []
+    for tile in sorted(tile_relations):
+        for direction, rel in sorted(tile_relations[tile].items()):
+            allowed = sorted(rel.get("allowed", ()))
+            forbidden = sorted(rel.get("forbidden", ()))
+            if allowed or forbidden:
+                entries.append((tile, direction, allowed, forbidden))
+    return fingerprint(entries)
+
+
+class GenerationCache:
+    """Generated maps keyed by (algorithm, params, width, height, seed, fingerprint).
+
+    Entries are dicts of arrays plus a small JSON-serialisable meta dict. When
+    over max_bytes the least recently used entries are dropped, or written to
+    spill_dir as .npz files and reloaded from there on a later hit.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, spill_dir: str | None = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[dict, dict]] = OrderedDict()
+        # Entries are shared with background generation threads
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def key(algorithm: str, params: dict, width: int, height: int, seed, tileset_fingerprint: str) -> str:
+        return fingerprint(algorithm, params, width, height, seed, tileset_fingerprint)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self._spill_path(key) is not None
+                                        and os.path.exists(self._spill_path(key)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def get(self, key: str) -> tuple[dict, dict] | None:
+        """(arrays, meta) for a key, or None. Arrays are read-only; copy before editing."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            entry = self._load_spilled(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, *entry)
+            return entry
+
+    def put(self, key: str, arrays: dict, meta: dict | None = None) -> None:
+        arrays = {name: np.array(a, copy=True) for name, a in arrays.items()}
+        for a in arrays.values():
+            a.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                old, _ = self._entries.pop(key)
+                self.nbytes -= sum(a.nbytes for a in old.values())
+            self._store(key, arrays, meta or {})
+
+    def _store(self, key: str, arrays: dict, meta: dict) -> None:
+        self._entries[key] = (arrays, meta)
+        self.nbytes += sum(a.nbytes for a in arrays.values())
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            old_key, (old, old_meta) = self._entries.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in old.values())
+            self._spill(old_key, old, old_meta)
+
+    def _spill_path(self, key: str) -> str | None:
+        return os.path.join(self.spill_dir, f"{key}.npz") if self.spill_dir else None
+
+    def _spill(self, key: str, arrays: dict, meta: dict) -> None:
+        path = self._spill_path(key)
+        if path is None or os.path.exists(path):
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+
+    def _load_spilled(self, key: str) -> tuple[dict, dict] | None:
+        path = self._spill_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        with np.load(path) as npz:
+            meta = json.loads(str(npz["__meta__"]))
+            arrays = {name: npz[name] for name in npz.files if name != "__meta__"}
+        for a in arrays.values():
+            a.flags.writeable = False
+        return arrays, meta
@@ -0,0 +1,89 @@
+"""
+Cellular automata cave engine.
+Runs birth/survival rules (e.g. B5678/S45678) as whole-array neighbour sums
+on a boolean wall grid instead of per-cell Python loops.
+"""
+
+import numpy as np
+
+# The original generators turned a cell into wall when 5+ of the 3x3 block
+# (self included) were walls. As a Moore-neighbourhood rule that is B5678/S45678.
+DEFAULT_RULE = "B5678/S45678"
+
+
+def parse_rule(rule: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parse a 'B.../S...' rule string into birth and survival lookup tables.
+
+    Each table is a bool array of length 9 indexed by live-neighbour count.
+    """
+    birth = np.zeros(9, dtype=bool)
+    survive = np.zeros(9, dtype=bool)
+    for part in rule.upper().replace(" ", "").split("/"):
+        if not part:
+            continue
+        if part[0] == "B":
+            table = birth
+        elif part[0] == "S":
+            table = survive
+        else:
+            raise ValueError(f"Invalid rule part '{part}' in '{rule}'")
+        for ch in part[1:]:
+            if not ch.isdigit() or int(ch) > 8:
+                raise ValueError(f"Invalid neighbour count '{ch}' in '{rule}'")
+            table[int(ch)] = True
+    return birth, survive
+
+
+def neighbour_count(grid: np.ndarray, edge_value: bool = True) -> np.ndarray:
+    """Count live Moore neighbours of every cell; out-of-bounds cells count as edge_value."""
+    h, w = grid.shape
+    padded = np.pad(grid.astype(np.uint8), 1, constant_values=int(edge_value))
+    counts = np.zeros((h, w), dtype=np.uint8)
+    for dy in range(3):
+        for dx in range(3):
+            if dy == 1 and dx == 1:
+                continue
+            counts += padded[dy:dy + h, dx:dx + w]
+    return counts
+
+
+def step_automaton(grid: np.ndarray, birth: np.ndarray, survive: np.ndarray,
+                   edge_value: bool = True) -> np.ndarray:
+    """Apply one birth/survival generation to a boolean grid."""
+    counts = neighbour_count(grid, edge_value)
+    return np.where(grid, survive[counts], birth[counts])
+
+
+def run_automaton(grid: np.ndarray, iterations: int, rule: str = DEFAULT_RULE,
+                  solid_border: bool = True, progress=None) -> np.ndarray:
+    """Run a rule for several generations. With solid_border the outer ring stays live.
+
+    `progress(done, total)` is called after every generation.
+    """
+    birth, survive = parse_rule(rule)
+    grid = grid.astype(bool, copy=True)
+    if solid_border:
+        _set_border(grid)
+    for i in range(iterations):
+        grid = step_automaton(grid, birth, survive, edge_value=solid_border)
+        if solid_border:
+            _set_border(grid)
+        if progress is not None:
+            progress(i + 1, iterations)
+    return grid
+
+
+def generate_cave_mask(width: int, height: int, fill_chance: float = 0.45,
+                       iterations: int = 5, rule: str = DEFAULT_RULE,
+                       rng: np.random.Generator | None = None, progress=None) -> np.ndarray:
+    """Generate a (height, width) bool mask where True marks wall cells."""
+    rng = rng if rng is not None else np.random.default_rng()
+    grid = rng.random((height, width)) < fill_chance
+    return run_automaton(grid, iterations, rule, solid_border=True, progress=progress)
+
+
+def _set_border(grid: np.ndarray) -> None:
+    grid[0, :] = True
+    grid[-1, :] = True
+    grid[:, 0] = True
+    grid[:, -1] = True
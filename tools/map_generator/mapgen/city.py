@@ -0,0 +1,63 @@
+"""
+Grid-city engine.
+Builds the block and street mask by broadcasting per-block sizes over the
+block periods, with optional irregular periods and alleys through blocks.
+"""
+
+import numpy as np
+
+
+def _periods(length: int, base: int, jitter: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Start offsets and sizes of consecutive periods covering [0, length)."""
+    count = length // max(1, base - jitter) + 1
+    sizes = np.full(count, base) if jitter <= 0 else rng.integers(base - jitter, base + jitter + 1, size=count)
+    sizes = np.maximum(sizes, 1)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    keep = starts < length
+    return starts[keep], sizes[keep]
+
+
+def _cell_index(length: int, starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """For each coordinate, its period index and offset inside that period."""
+    coords = np.arange(length)
+    index = np.searchsorted(starts, coords, side="right") - 1
+    return index, coords - starts[index]
+
+
+def city_layout(width: int, height: int, block_size: int = 8, street_width: int = 2,
+                jitter: int = 0, alley_chance: float = 0.0, alley_width: int = 1,
+                rng: np.random.Generator | None = None) -> np.ndarray:
+    """Generate a (height, width) bool mask where True marks building (wall) cells.
+
+    Each period is one block plus a street. Blocks are block_size - 2 to
+    block_size cells on a side; `jitter` varies each row and column period by
+    up to that many cells, and `alley_chance` is the chance that a block is
+    split by a horizontal or vertical alley.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    period = block_size + street_width
+    col_starts, col_sizes = _periods(width, period, jitter, rng)
+    row_starts, row_sizes = _periods(height, period, jitter, rng)
+    col, ox = _cell_index(width, col_starts)
+    row, oy = _cell_index(height, row_starts)
+
+    # Block footprints follow their period so streets keep their width
+    col_block = np.maximum(col_sizes - street_width, 1)
+    row_block = np.maximum(row_sizes - street_width, 1)
+    shape = (len(row_starts), len(col_starts))
+    bw = rng.integers(np.maximum(col_block - 2, 1), col_block + 1, size=shape)
+    bh = rng.integers(np.maximum(row_block - 2, 1)[:, None], row_block[:, None] + 1, size=shape)
+
+    walls = (ox[None, :] < bw[row[:, None], col[None, :]]) & (oy[:, None] < bh[row[:, None], col[None, :]])
+
+    if alley_chance > 0:
+        # 0 = none, 1 = vertical, 2 = horizontal, cut through the block middle
+        kind = np.where(rng.random(shape) < alley_chance, rng.integers(1, 3, size=shape), 0)
+        pos_x = bw // 2 - alley_width // 2
+        pos_y = bh // 2 - alley_width // 2
+        k = kind[row[:, None], col[None, :]]
+        dx = ox[None, :] - pos_x[row[:, None], col[None, :]]
+        dy = oy[:, None] - pos_y[row[:, None], col[None, :]]
+        alley = ((k == 1) & (dx >= 0) & (dx < alley_width)) | ((k == 2) & (dy >= 0) & (dy < alley_width))
+        walls &= ~alley
+    return walls
@@ -0,0 +1,299 @@
+"""
+Generation core.
+TileSet, GameMap, the MapGenerator algorithms, presets and exporters with no
+GUI, web or PIL import at module load, so headless scripts start fast. PIL is
+only imported when a tileset image is actually loaded.
+"""
+
+import json
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .bsp import bsp_layout
+from .cache import TileRenderCache, fingerprint
+from .city import city_layout
+from .cellular import DEFAULT_RULE, generate_cave_mask
+from .painter import build_variants, paint
+from .render import dedup_tiles, sheet_tile_ids, slice_grid
+from .roles import FLOOR, WALL, empty_roles, codes_from_names, names_from_codes
+from .binmap import open_binary, save_binary
+from .godot import encode_tile_map_data, format_packed_byte_array
+from .mapformat import pack_map, dump_map
+from .wfc import WFCModel, generate_chunks, solve as solve_wfc
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+class TileSet:
+    """Manages the loaded tileset."""
+    def __init__(self):
+        self.image: "Image.Image" = None
+        self.tile_images: list["Image.Image"] = []
+        self.tile_roles: list[str] = []
+        self.tile_weights: list[float] = []
+        self.tile_width = 16
+        self.tile_height = 16
+        self.columns = 16       # Atlas columns, for tile id -> atlas coordinates
+        # Sheet cell of each tile after dedup, and each cell's tile (-1 for blanks);
+        # None when tile ids are sheet cells already
+        self.tile_cells: np.ndarray | None = None
+        self.cell_tiles: np.ndarray | None = None
+        self.path = ""
+        # Scaled tile pixels for redraws; cleared whenever tiles are reloaded
+        self.render_cache = TileRenderCache()
+        
+    def load(self, path: str, tile_w: int, tile_h: int, dedup: bool = True):
+        """Load tileset and split into tiles.
+        
+        With dedup, fully transparent cells are dropped and identical cells share
+        one tile; exports map tile ids back to sheet cells through tile_cells.
+        """
+        from PIL import Image
+        
+        self.image = Image.open(path).convert("RGBA")
+        self.path = path
+        self.tile_width = tile_w
+        self.tile_height = tile_h
+        self.tile_images.clear()
+        self.tile_roles.clear()
+        self.tile_weights.clear()
+        self.render_cache.clear()
+        
+        grid = slice_grid(np.asarray(self.image), tile_w, tile_h)
+        rows, cols = grid.shape[:2]
+        self.columns = cols
+        tiles = grid.reshape(rows * cols, tile_h, tile_w, 4)
+        if dedup:
+            self.tile_cells, self.cell_tiles = dedup_tiles(tiles)
+        else:
+            self.tile_cells = self.cell_tiles = None
+        kept = tiles if self.tile_cells is None else tiles[self.tile_cells]
+        
+        self.tile_images.extend(Image.fromarray(tile, "RGBA") for tile in kept)
+        self.tile_roles.extend(["empty"] * len(kept))
+        self.tile_weights.extend([1.0] * len(kept))
+        
+        return len(self.tile_images)
+    
+    def fingerprint(self) -> str:
+        """Hash of everything generation depends on: tile count, roles and weights."""
+        return fingerprint(len(self.tile_images), self.tile_roles, self.tile_weights)
+    
+    def sheet_ids(self, data: np.ndarray) -> np.ndarray:
+        """Tile ids of a map as sheet cells, for files that address the tileset atlas."""
+        return sheet_tile_ids(data, self.tile_cells)
+
+
+class GameMap:
+    """Represents the generated map.
+    
+    `data` holds tile ids (int32), `roles` holds uint8 codes into TILE_ROLES.
+    """
+    def __init__(self, width: int = 40, height: int = 25):
+        self.width = width
+        self.height = height
+        self.data = np.zeros((height, width), dtype=np.int32)
+        self.roles = empty_roles(height, width)
+        
+    def resize(self, width: int, height: int):
+        """Resize the map."""
+        new_data = np.zeros((height, width), dtype=np.int32)
+        new_roles = empty_roles(height, width)
+        
+        min_h = min(height, self.height)
+        min_w = min(width, self.width)
+        new_data[:min_h, :min_w] = self.data[:min_h, :min_w]
+        new_roles[:min_h, :min_w] = self.roles[:min_h, :min_w]
+        
+        self.data = new_data
+        self.roles = new_roles
+        self.width = width
+        self.height = height
+    
+    @classmethod
+    def from_arrays(cls, data: np.ndarray, roles: np.ndarray) -> "GameMap":
+        """Wrap existing layers (views or memmaps) without copying."""
+        game_map = cls.__new__(cls)
+        game_map.height, game_map.width = data.shape
+        game_map.data = data
+        game_map.roles = roles
+        return game_map
+    
+    @classmethod
+    def open_binary(cls, path: str, mode: str = "r") -> "GameMap":
+        """Map backed by a binary container's memmaps; use mode "r+" to generate or edit in place."""
+        container = open_binary(path, mode)
+        return cls.from_arrays(container.tiles, container.roles)
+    
+    def region(self, x: int, y: int, width: int, height: int) -> "GameMap":
+        """A view of a rectangle of this map; writes go through to the parent."""
+        return GameMap.from_arrays(self.data[y:y + height, x:x + width], self.roles[y:y + height, x:x + width])
+
+
+# =============================================================================
+# GENERATION ALGORITHMS
+# =============================================================================
+
+class MapGenerator:
+    """Generation algorithms; they only read tile_roles and tile_weights from the tileset."""
+    
+    @staticmethod
+    def get_tiles_by_role(tileset: TileSet, role: str) -> list[int]:
+        return [i for i, r in enumerate(tileset.tile_roles) if r == role]
+    
+    @staticmethod
+    def paint_tiles(game_map: GameMap, tileset: TileSet, rng: np.random.Generator) -> None:
+        """Turn the role layer into tile ids with weighted per-role variants."""
+        variants = build_variants(tileset.tile_roles, tileset.tile_weights or None)
+        paint(game_map.roles, variants, rng, out=game_map.data)
+    
+    @staticmethod
+    def bsp_dungeon(game_map: GameMap, tileset: TileSet, 
+                    min_room_size: int = 5, max_room_size: int = 10,
+                    corridor_width: int = 2, seed: int | None = None) -> None:
+        rng = np.random.default_rng(seed)
+        floor, _ = bsp_layout(game_map.width, game_map.height, min_room_size, max_room_size,
+                              corridor_width, rng=rng)
+        
+        game_map.roles[...] = np.where(floor, FLOOR, WALL)
+        MapGenerator.paint_tiles(game_map, tileset, rng)
+    
+    @staticmethod
+    def cellular_automata(game_map: GameMap, tileset: TileSet,
+                          fill_chance: float = 0.45, iterations: int = 5,
+                          rule: str = DEFAULT_RULE, seed: int | None = None, progress=None) -> None:
+        rng = np.random.default_rng(seed)
+        step = None if progress is None else (lambda done, total: progress(done, total, "caves"))
+        walls = generate_cave_mask(game_map.width, game_map.height, fill_chance, iterations, rule, rng,
+                                   progress=step)
+        
+        game_map.roles[...] = np.where(walls, WALL, FLOOR)
+        MapGenerator.paint_tiles(game_map, tileset, rng)
+    
+    @staticmethod
+    def grid_city(game_map: GameMap, tileset: TileSet,
+                  block_size: int = 8, street_width: int = 2,
+                  jitter: int = 0, alley_chance: float = 0.0, seed: int | None = None) -> None:
+        rng = np.random.default_rng(seed)
+        walls = city_layout(game_map.width, game_map.height, block_size, street_width,
+                            jitter, alley_chance, rng=rng)
+        
+        game_map.roles[...] = np.where(walls, WALL, FLOOR)
+        MapGenerator.paint_tiles(game_map, tileset, rng)
+    
+    @staticmethod
+    def wfc(game_map: GameMap, tileset: TileSet, tile_relations: dict | None = None,
+            seed: int | None = None, **solve_params) -> dict:
+        """Wave Function Collapse over the tileset; returns the solver report.
+        
+        Without tile_relations, tiles of the same role may touch in every direction.
+        """
+        model = MapGenerator.wfc_model(tileset, tile_relations)
+        tiles, report = solve_wfc(model, game_map.width, game_map.height, seed=seed, **solve_params)
+        game_map.data[...] = tiles
+        game_map.roles[...] = codes_from_names(tileset.tile_roles)[tiles]
+        return report
+    
+    @staticmethod
+    def wfc_chunked(game_map: GameMap, tileset: TileSet, tile_relations: dict | None = None,
+                    seed: int | None = None, chunk_size: int = 64, overlap: int = 3, **solve_params) -> dict:
+        """WFC solved chunk by chunk (see mapgen.wfc.generate_chunks), each chunk written as it is done.
+        
+        With a map backed by a binary container (create_binary, GameMap.open_binary)
+        memory depends on the chunk size, not the map size. Returns a summary of the
+        chunk reports: chunks, success (all chunks), timed_out (any) and wall_time.
+        """
+        model = MapGenerator.wfc_model(tileset, tile_relations)
+        codes = codes_from_names(tileset.tile_roles)
+        summary = {"chunks": 0, "success": True, "timed_out": False, "wall_time": 0.0}
+        for x0, y0, tiles, report in generate_chunks(model, game_map.width, game_map.height, chunk_size,
+                                                     seed=seed, overlap=overlap, **solve_params):
+            h, w = tiles.shape
+            game_map.data[y0:y0 + h, x0:x0 + w] = tiles
+            game_map.roles[y0:y0 + h, x0:x0 + w] = codes[tiles]
+            summary["chunks"] += 1
+            summary["success"] &= report["success"]
+            summary["timed_out"] |= report["timed_out"]
+            summary["wall_time"] += report["wall_time"]
+        return summary
+    
+    @staticmethod
+    def wfc_model(tileset: TileSet, tile_relations: dict | None = None) -> WFCModel:
+        """Model from explicit relations, or letting tiles of the same role touch in every direction."""
+        weights = tileset.tile_weights or None
+        if tile_relations is None:
+            return WFCModel.from_roles(tileset.tile_roles, weights)
+        return WFCModel.from_relations(tile_relations, len(tileset.tile_roles), weights)
+
+
+# =============================================================================
+# PRESETS
+# =============================================================================
+
+PRESETS = {
+    "Sewer": {"algorithm": "bsp", "params": {"min_room_size": 4, "max_room_size": 8, "corridor_width": 2}},
+    "Urban": {"algorithm": "grid", "params": {"block_size": 10, "street_width": 3}},
+    "Office": {"algorithm": "bsp", "params": {"min_room_size": 6, "max_room_size": 12, "corridor_width": 2}},
+    "Caves": {"algorithm": "cellular", "params": {"fill_chance": 0.48, "iterations": 6}}
+}
+
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+class Exporter:
+    @staticmethod
+    def to_json(game_map: GameMap, tileset: TileSet, path: str) -> None:
+        data = {
+            "width": game_map.width,
+            "height": game_map.height,
+            "tile_width": tileset.tile_width,
+            "tile_height": tileset.tile_height,
+            "tileset_path": os.path.basename(tileset.path),
+            "tiles": tileset.sheet_ids(game_map.data).tolist(),
+            "roles": names_from_codes(game_map.roles)
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+    
+    @staticmethod
+    def to_compact_json(game_map: GameMap, tileset: TileSet, path: str,
+                        encoding: str = "rle", compress: bool = False) -> None:
+        """Version 2 map file: RLE or base64 layers, see mapgen.mapformat."""
+        doc = pack_map(tileset.sheet_ids(game_map.data), game_map.roles, encoding, compress,
+                       tile_width=tileset.tile_width, tile_height=tileset.tile_height,
+                       tileset_path=os.path.basename(tileset.path))
+        with open(path, 'w') as f:
+            dump_map(doc, f)
+    
+    @staticmethod
+    def to_binary(game_map: GameMap, tileset: TileSet, path: str) -> None:
+        """Binary container readable through np.memmap, see mapgen.binmap."""
+        save_binary(path, tileset.sheet_ids(game_map.data), game_map.roles,
+                    tile_width=tileset.tile_width, tile_height=tileset.tile_height,
+                    tileset_path=os.path.basename(tileset.path))
+    
+    @staticmethod
+    def to_tscn(game_map: GameMap, tileset: TileSet, path: str, with_json: bool = False) -> None:
+        """TileMapLayer scene with the tiles embedded as binary tile_map_data.
+        
+        with_json also writes the old `_data.json` side file for map_loader.gd.
+        """
+        tile_map_data = encode_tile_map_data(tileset.sheet_ids(game_map.data), tileset.columns)
+        tscn = f'''[gd_scene load_steps=2 format=3]
+[ext_resource type="TileSet" path="res://tileset.tres" id="1"]
+[node name="GeneratedMap" type="TileMapLayer"]
+tile_map_data = {format_packed_byte_array(tile_map_data)}
+tile_set = ExtResource("1")
+'''
+        with open(path, 'w') as f:
+            f.write(tscn)
+        if with_json:
+            Exporter.to_json(game_map, tileset, path.replace('.tscn', '_data.json'))
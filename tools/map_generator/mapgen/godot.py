@@ -0,0 +1,93 @@
+"""
+Godot scene encodings.
+Godot 4 TileMapLayer `tile_map_data` is a PackedByteArray: a uint16 format
+version followed by one 12-byte record per cell. Records are built as a NumPy
+structured array so a whole map encodes in one pass.
+"""
+
+import base64
+
+import numpy as np
+
+TILE_MAP_DATA_VERSION = 0
+# x, y, source id, atlas x, atlas y, alternative tile; all little-endian 16-bit
+CELL_DTYPE = np.dtype([("x", "<i2"), ("y", "<i2"), ("source", "<u2"),
+                       ("atlas_x", "<u2"), ("atlas_y", "<u2"), ("alternative", "<u2")])
+
+_POW10 = 10 ** np.arange(1, 10, dtype=np.int64)
+
+# "0, " .. "255, " as fixed-width rows plus a mask of their used columns
+_BYTE_TEXT = np.zeros((256, 5), dtype=np.uint8)
+for _b in range(256):
+    _text = f"{_b}, ".encode("ascii")
+    _BYTE_TEXT[_b, :len(_text)] = np.frombuffer(_text, dtype=np.uint8)
+_BYTE_KEEP = _BYTE_TEXT != 0
+del _b, _text
+
+
+def format_int_list(data) -> str:
+    """Join int32 values as "a, b, c" by writing their decimal digits column-wise.
+
+    Same text as ', '.join(map(str, data)) without a Python str per value.
+    """
+    values = np.asarray(data, dtype=np.int64).ravel()
+    if values.size == 0:
+        return ""
+    magnitude = np.abs(values).astype(np.uint32)
+    digits = np.searchsorted(_POW10, magnitude, side="right") + 1
+    width = int(digits.max()) + 1  # One spare column for a minus sign
+
+    # One row per value: right-aligned digits, then ", "; `keep` drops the padding
+    buf = np.empty((values.size, width + 2), dtype=np.uint8)
+    keep = np.empty(buf.shape, dtype=bool)
+    keep[:, :width] = np.arange(width - 1, -1, -1)[None, :] < digits[:, None]
+    rest = magnitude
+    for k in range(width - 1):
+        rest, digit = np.divmod(rest, np.uint32(10))
+        buf[:, width - 1 - k] = digit
+    buf[:, 1:width] += ord("0")
+    neg = np.flatnonzero(values < 0)
+    sign_col = width - 1 - digits[neg]
+    buf[neg, sign_col] = ord("-")
+    keep[neg, sign_col] = True
+    buf[:, width:] = np.frombuffer(b", ", dtype=np.uint8)
+    keep[:, width:] = True
+    keep[-1, width:] = False
+    return buf[keep].tobytes().decode("ascii")
+
+
+def encode_tile_map_data(tiles: np.ndarray, columns: int = 16, source_id: int = 0,
+                         origin: tuple[int, int] = (0, 0)) -> bytes:
+    """Encode a (H, W) tile-id grid as TileMapLayer tile_map_data bytes.
+
+    Tile ids map to atlas coordinates row-major over `columns`; cells with
+    id < 0 are left empty. `origin` offsets the cell coordinates.
+    """
+    tiles = np.asarray(tiles)
+    ys, xs = np.nonzero(tiles >= 0)
+    index = tiles[ys, xs].astype(np.int64)
+    cells = np.empty(len(index), dtype=CELL_DTYPE)
+    cells["x"] = xs + origin[0]
+    cells["y"] = ys + origin[1]
+    cells["source"] = source_id
+    cells["atlas_x"] = index % columns
+    cells["atlas_y"] = index // columns
+    cells["alternative"] = 0
+    return np.array([TILE_MAP_DATA_VERSION], dtype="<u2").tobytes() + cells.tobytes()
+
+
+def decode_tile_map_data(data: bytes) -> np.ndarray:
+    """Cell records of tile_map_data bytes as a CELL_DTYPE array."""
+    version = int(np.frombuffer(data[:2], dtype="<u2")[0])
+    if version != TILE_MAP_DATA_VERSION:
+        raise ValueError(f"Unsupported tile_map_data version {version}")
+    return np.frombuffer(data, dtype=CELL_DTYPE, offset=2)
+
+
+def format_packed_byte_array(data: bytes, as_base64: bool = False) -> str:
+    """PackedByteArray text: decimal bytes, or the base64 string form newer Godot writes."""
+    if as_base64:
+        return f'PackedByteArray("{base64.b64encode(data).decode("ascii")}")'
+    values = np.frombuffer(data, dtype=np.uint8)
+    text = _BYTE_TEXT[values][_BYTE_KEEP[values]].tobytes()[:-2]
+    return f"PackedByteArray({text.decode('ascii')})"
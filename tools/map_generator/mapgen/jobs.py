@@ -0,0 +1,137 @@
+"""
+Background generation jobs.
+A small thread-pool job queue: every job gets a `progress(done, total, stage)`
+callback that records how far it got and raises JobCancelled once a cancel
+was requested, so long generators stop at their next progress report.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# The job each worker thread is running
+_running = threading.local()
+
+
+def current_job() -> "Job | None":
+    """The Job being run by the calling thread, or None outside a job."""
+    return getattr(_running, "job", None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job from its progress callback after cancel()."""
+
+
+class Job:
+    """One unit of work and its observable state."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def progress(self, done: int, total: int, stage: str = "") -> None:
+        """Record progress; raises JobCancelled when the job should stop."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done, self.total = int(done), int(total)
+        if stage:
+            self.stage = stage
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        if self.status == QUEUED:
+            self._finish(CANCELLED)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _finish(self, status: str, result=None, error: str | None = None) -> None:
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "status": self.status, "stage": self.stage,
+                "done": self.done, "total": self.total, "error": self.error}
+
+
+class JobQueue:
+    """Runs callables on a thread pool and keeps the latest `keep` jobs for polling.
+
+    Submitted functions are called as fn(*args, progress=job.progress, **kwargs).
+    """
+
+    def __init__(self, max_workers: int = 2, keep: int = 64):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mapgen-job")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def _add(self) -> Job:
+        with self._lock:
+            job = Job(uuid.uuid4().hex[:12])
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs beyond `keep`
+            excess = len(self._jobs) - self.keep
+            if excess > 0:
+                for old in [j.id for j in self._jobs.values() if j.status in FINISHED][:excess]:
+                    del self._jobs[old]
+        return job
+
+    def submit(self, fn, *args, **kwargs) -> Job:
+        job = self._add()
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def completed(self, result) -> Job:
+        """A job that is already done, for results that needed no work (cache hits)."""
+        job = self._add()
+        job._finish(DONE, result)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs) -> None:
+        if job.cancelled:
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        _running.job = job
+        try:
+            result = fn(*args, progress=job.progress, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            job._finish(DONE, result)
+        finally:
+            _running.job = None
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,112 @@
+"""
+Compact map JSON.
+Version 2 of the map file stores each layer as run-length pairs or as base64
+little-endian bytes (optionally zlib-compressed) instead of nested lists, and
+roles as small integer codes with their names listed once. Version 1 is the
+original nested-list format written by Exporter.to_json; readers accept both.
+"""
+
+import base64
+import json
+import zlib
+
+import numpy as np
+
+from .roles import TILE_ROLES, ROLE_DTYPE, codes_from_names
+
+COMPACT_FORMAT = "flatline-map"
+COMPACT_VERSION = 2
+ENCODINGS = ("rle", "base64")
+TILE_DTYPE = np.dtype("<i4")
+
+
+def encode_layer(array: np.ndarray, encoding: str = "rle", compress: bool = False) -> dict:
+    """Encode a 2D layer; `compress` adds zlib to base64 layers."""
+    flat = np.ascontiguousarray(array).ravel()
+    if encoding == "rle":
+        if flat.size == 0:
+            return {"encoding": "rle", "values": [], "counts": []}
+        starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+        counts = np.diff(np.append(starts, flat.size))
+        return {"encoding": "rle", "values": flat[starts].tolist(), "counts": counts.tolist()}
+    if encoding == "base64":
+        dtype = flat.dtype.newbyteorder("<")
+        raw = flat.astype(dtype, copy=False).tobytes()
+        if compress:
+            raw = zlib.compress(raw)
+        return {"encoding": "base64", "dtype": dtype.str, "zlib": compress,
+                "data": base64.b64encode(raw).decode("ascii")}
+    raise ValueError(f"Unknown layer encoding {encoding!r}, expected one of {ENCODINGS}")
+
+
+def decode_layer(layer: dict, height: int, width: int, dtype) -> np.ndarray:
+    """Decode a layer written by encode_layer into a (height, width) array of `dtype`."""
+    encoding = layer.get("encoding")
+    if encoding == "rle":
+        flat = np.repeat(np.asarray(layer["values"], dtype=dtype), np.asarray(layer["counts"], dtype=np.intp))
+    elif encoding == "base64":
+        raw = base64.b64decode(layer["data"])
+        if layer.get("zlib"):
+            raw = zlib.decompress(raw)
+        flat = np.frombuffer(raw, dtype=np.dtype(layer["dtype"])).astype(dtype)
+    else:
+        raise ValueError(f"Unknown layer encoding {encoding!r}")
+    if flat.size != width * height:
+        raise ValueError(f"Layer has {flat.size} cells, expected {width}x{height}")
+    return flat.reshape(height, width)
+
+
+def pack_map(tiles: np.ndarray, roles: np.ndarray, encoding: str = "rle",
+             compress: bool = False, **meta) -> dict:
+    """Build a version 2 map document; `meta` holds tile size, tileset path and the like."""
+    height, width = tiles.shape
+    return {
+        "format": COMPACT_FORMAT,
+        "version": COMPACT_VERSION,
+        "width": width,
+        "height": height,
+        **meta,
+        "role_names": list(TILE_ROLES),
+        "tiles": encode_layer(tiles.astype(TILE_DTYPE, copy=False), encoding, compress),
+        "roles": encode_layer(roles.astype(ROLE_DTYPE, copy=False), encoding, compress),
+    }
+
+
+def is_compact(data: dict) -> bool:
+    return data.get("format") == COMPACT_FORMAT
+
+
+def unpack_map(data: dict) -> dict:
+    """Normalise either map format to a dict with int32 `tiles` and uint8 role-code `roles`.
+
+    Other top-level fields (width, height, tile size, tileset path) are kept.
+    """
+    out = {k: v for k, v in data.items() if k not in ("format", "version", "role_names", "tiles", "roles")}
+    if is_compact(data):
+        if data.get("version", COMPACT_VERSION) > COMPACT_VERSION:
+            raise ValueError(f"Map format version {data['version']} is newer than {COMPACT_VERSION}")
+        h, w = data["height"], data["width"]
+        tiles = decode_layer(data["tiles"], h, w, np.int32)
+        codes = decode_layer(data["roles"], h, w, ROLE_DTYPE)
+        # Re-map through the stored names so files survive role-table changes
+        roles = codes_from_names(data.get("role_names", TILE_ROLES))[codes]
+    else:
+        tiles = np.asarray(data.get("tiles") or [], dtype=np.int32)
+        if tiles.ndim != 2:
+            tiles = tiles.reshape(data.get("height", 0), data.get("width", 0))
+        roles = codes_from_names(data["roles"]) if data.get("roles") else np.zeros(tiles.shape, dtype=ROLE_DTYPE)
+    out["width"], out["height"] = tiles.shape[1], tiles.shape[0]
+    out["tiles"] = tiles
+    out["roles"] = roles
+    return out
+
+
+def dump_map(doc: dict, fp) -> None:
+    """Write a version 2 document without whitespace."""
+    json.dump(doc, fp, separators=(",", ":"))
+
+
+def load_map(path: str) -> dict:
+    """Read a map file in either format, normalised by unpack_map."""
+    with open(path, "r") as f:
+        return unpack_map(json.load(f))
@@ -0,0 +1,63 @@
+"""
+Tile-variant painter.
+Generators only produce role layouts; the painter turns a role grid into tile
+ids with one weighted draw per role from a seeded NumPy Generator.
+"""
+
+import numpy as np
+
+from .roles import ROLE_CODES, FLOOR, WALL
+
+
+def build_variants(tile_roles: list[str], weights=None) -> dict[int, tuple[np.ndarray, np.ndarray | None]]:
+    """Group tiles by role code as {code: (tile ids, probabilities or None)}.
+
+    `weights` is a sequence (or dict) of per-tile weights; tiles with weight
+    <= 0 are never drawn. Floor and wall fall back to tiles 0 and 1 like the
+    generators always did when no tile carries those roles.
+    """
+    if weights is not None and not isinstance(weights, dict):
+        weights = dict(enumerate(weights))
+    groups: dict[int, list[int]] = {}
+    for i, name in enumerate(tile_roles):
+        code = ROLE_CODES.get(name)
+        if code is not None:
+            groups.setdefault(code, []).append(i)
+    groups.setdefault(FLOOR, [0])
+    groups.setdefault(WALL, [1] if len(tile_roles) > 1 else [0])
+
+    variants = {}
+    for code, tiles in groups.items():
+        tiles = np.asarray(tiles, dtype=np.int32)
+        probs = None
+        if weights is not None:
+            w = np.array([max(float(weights.get(int(t), 1.0)), 0.0) for t in tiles])
+            if w.sum() > 0:
+                keep = w > 0
+                tiles, w = tiles[keep], w[keep]
+                probs = w / w.sum() if not np.all(w == w[0]) else None
+        variants[code] = (tiles, probs)
+    return variants
+
+
+def paint(roles: np.ndarray, variants: dict, rng: np.random.Generator | None = None,
+          out: np.ndarray | None = None, missing: int = -1) -> np.ndarray:
+    """Fill a tile grid from a role grid, one vectorized draw per role present.
+
+    Cells whose role has no variants get `missing`.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if out is None:
+        out = np.empty(roles.shape, dtype=np.int32)
+    out.fill(missing)
+    counts = np.bincount(roles.ravel(), minlength=max(variants, default=0) + 1)
+    for code, (tiles, probs) in variants.items():
+        n = int(counts[code]) if code < len(counts) else 0
+        if n == 0:
+            continue
+        mask = roles == code
+        if len(tiles) == 1:
+            out[mask] = tiles[0]
+        else:
+            out[mask] = rng.choice(tiles, size=n, p=probs)
+    return out
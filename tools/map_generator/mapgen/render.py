@@ -0,0 +1,146 @@
+"""
+Vectorized map rendering.
+Tiles are stacked once into an (N, cell, cell, 4) atlas and a whole map is
+composited with a single fancy-index and reshape; cells without a tile image
+fall back to their role colour through the ROLE_COLORS lookup table.
+Tilesets are cut into tiles with a strided view rather than per-tile crops,
+then blank and duplicate tiles are collapsed so generators only see distinct ones.
+"""
+
+import numpy as np
+
+from .roles import ROLE_COLOR_LUT
+
+BACKGROUND = (40, 40, 40, 255)
+
+
+def scale_nearest(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Nearest-neighbour resize of an (h, w, C) array, sampling pixel centres."""
+    h, w = pixels.shape[:2]
+    ys = ((np.arange(height) + 0.5) * h / height).astype(np.intp)
+    xs = ((np.arange(width) + 0.5) * w / width).astype(np.intp)
+    return pixels[ys[:, None], xs[None, :]]
+
+
+def tile_pixels(tile) -> np.ndarray:
+    """RGBA pixels of a tile image (PIL image or array) as an (h, w, 4) uint8 array."""
+    if isinstance(tile, np.ndarray):
+        pixels = tile
+    else:
+        pixels = np.asarray(tile.convert("RGBA") if tile.mode != "RGBA" else tile)
+    if pixels.shape[2] == 3:
+        alpha = np.full(pixels.shape[:2] + (1,), 255, dtype=np.uint8)
+        pixels = np.concatenate([pixels, alpha], axis=2)
+    return pixels
+
+
+def slice_grid(pixels: np.ndarray, tile_w: int, tile_h: int, spacing=(0, 0), offset=(0, 0)) -> np.ndarray:
+    """(rows, cols, tile_h, tile_w, C) strided view of the tiles of an (H, W, C) sheet.
+
+    Tiles start at `offset` and are `spacing` pixels apart; partial tiles at the
+    right and bottom edges are left out. No pixels are copied.
+    """
+    if tile_w <= 0 or tile_h <= 0:
+        raise ValueError("Tile size must be positive")
+    (sx, sy), (ox, oy) = spacing, offset
+    if sx < 0 or sy < 0 or ox < 0 or oy < 0:
+        raise ValueError("Spacing and offset can't be negative")
+    h, w, c = pixels.shape
+    cols = (w - ox - tile_w) // (tile_w + sx) + 1 if w >= ox + tile_w else 0
+    rows = (h - oy - tile_h) // (tile_h + sy) + 1 if h >= oy + tile_h else 0
+    s_y, s_x, s_c = pixels.strides
+    return np.lib.stride_tricks.as_strided(
+        pixels[oy:, ox:], shape=(rows, cols, tile_h, tile_w, c),
+        strides=((tile_h + sy) * s_y, (tile_w + sx) * s_x, s_y, s_x, s_c), writeable=False)
+
+
+def pack_grid(tiles: np.ndarray, columns: int) -> np.ndarray:
+    """Lay (N, h, w, C) tiles out row-major, `columns` per row, as one (rows * h, columns * w, C) image.
+
+    Tile i sits at pixel ((i % columns) * w, (i // columns) * h); a short last
+    row is padded with transparent cells.
+    """
+    n, h, w, c = tiles.shape
+    columns = max(1, columns)
+    rows = -(-n // columns)
+    grid = np.zeros((rows * columns, h, w, c), dtype=tiles.dtype)
+    grid[:n] = tiles
+    return grid.reshape(rows, columns, h, w, c).transpose(0, 2, 1, 3, 4).reshape(rows * h, columns * w, c)
+
+
+def dedup_tiles(tiles: np.ndarray, drop_blank: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """Collapse pixel-identical (N, h, w, C) tiles to one canonical tile each.
+
+    Returns (cells, remap): cells[k] is the index of the first tile equal to
+    canonical tile k, in sheet order, and remap[i] is the canonical index of
+    tile i, or -1 for a fully transparent tile when drop_blank is set.
+    """
+    n = len(tiles)
+    remap = np.full(n, -1, dtype=np.int32)
+    keep = np.arange(n)
+    if drop_blank and tiles.shape[-1] == 4:
+        keep = keep[tiles[..., 3].reshape(n, -1).any(axis=1)]
+    if len(keep) == 0:
+        return np.zeros(0, dtype=np.int32), remap
+    # Each tile's bytes as one opaque value, so np.unique compares whole tiles
+    flat = np.ascontiguousarray(tiles[keep]).reshape(len(keep), -1)
+    keys = flat.view(np.dtype((np.void, flat.shape[1])))[:, 0]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    remap[keep] = rank[inverse.reshape(-1)]
+    return keep[first[order]].astype(np.int32), remap
+
+
+def sheet_tile_ids(tiles: np.ndarray, cells: np.ndarray | None) -> np.ndarray:
+    """Translate canonical tile ids back to sheet cell indices through dedup_tiles' `cells`.
+
+    Ids outside [0, len(cells)) are kept as they are; cells None means the ids
+    already are sheet cells.
+    """
+    if cells is None or len(cells) == 0:
+        return tiles
+    valid = (tiles >= 0) & (tiles < len(cells))
+    return np.where(valid, cells[np.where(valid, tiles, 0)], tiles).astype(tiles.dtype, copy=False)
+
+
+def flatten_over(tiles: np.ndarray, background=BACKGROUND) -> np.ndarray:
+    """Alpha-composite (..., 4) RGBA tiles over a solid background, as PIL paste with mask does."""
+    alpha = tiles[..., 3:4].astype(np.uint16)
+    bg = np.asarray(background, dtype=np.uint16)
+    out = (tiles.astype(np.uint16) * alpha + bg * (255 - alpha) + 127) // 255
+    return out.astype(np.uint8)
+
+
+def build_atlas(tile_images, cell: int, background=BACKGROUND, cache=None) -> np.ndarray:
+    """Stack tiles scaled to cell x cell and flattened over the background.
+
+    Returns an (N + R, cell, cell, 4) array: the N tiles followed by one solid
+    tile per role colour, so role fallbacks are just indices N + role.
+    Scaled tiles come from `cache` (a TileRenderCache) when one is given.
+    """
+    n = len(tile_images)
+    atlas = np.empty((n + len(ROLE_COLOR_LUT), cell, cell, 4), dtype=np.uint8)
+    for i, tile in enumerate(tile_images):
+        if cache is not None:
+            atlas[i] = cache.get(tile_images, i, (cell, cell))
+        else:
+            atlas[i] = scale_nearest(tile_pixels(tile), cell, cell)
+    atlas[:n] = flatten_over(atlas[:n], background)
+    atlas[n:, :, :, :3] = ROLE_COLOR_LUT[:, None, None, :]
+    atlas[n:, :, :, 3] = 255
+    return atlas
+
+
+def composite(tiles: np.ndarray, roles: np.ndarray, atlas: np.ndarray, n_tiles: int) -> np.ndarray:
+    """Render a (H, W) tile grid into an (H * cell, W * cell, 4) RGBA array.
+
+    Cells whose tile id is outside [0, n_tiles) use their role colour instead.
+    """
+    h, w = tiles.shape
+    cell = atlas.shape[1]
+    valid = (tiles >= 0) & (tiles < n_tiles)
+    index = np.where(valid, tiles, n_tiles + roles.astype(np.intp))
+    # (H, W, cell, cell, 4) -> rows of cells interleaved with rows of pixels
+    return atlas[index].transpose(0, 2, 1, 3, 4).reshape(h * cell, w * cell, 4)
@@ -0,0 +1,50 @@
+"""
+Integer-coded tile roles.
+Role layers are uint8 arrays indexed into TILE_ROLES; names are only
+produced at the JSON boundary.
+"""
+
+import numpy as np
+
+TILE_ROLES = ["empty", "floor", "wall", "decoration", "water", "door", "spawn", "exit"]
+ROLE_COLORS = {
+    "empty": (51, 51, 51),
+    "floor": (139, 115, 85),
+    "wall": (74, 74, 74),
+    "decoration": (107, 142, 35),
+    "water": (70, 130, 180),
+    "door": (205, 133, 63),
+    "spawn": (50, 205, 50),
+    "exit": (255, 69, 0)
+}
+
+EMPTY, FLOOR, WALL, DECORATION, WATER, DOOR, SPAWN, EXIT = range(len(TILE_ROLES))
+ROLE_CODES = {name: code for code, name in enumerate(TILE_ROLES)}
+ROLE_DTYPE = np.uint8
+
+# (len(TILE_ROLES), 3) uint8 table: ROLE_COLOR_LUT[roles] gives an RGB image
+ROLE_COLOR_LUT = np.array([ROLE_COLORS[name] for name in TILE_ROLES], dtype=np.uint8)
+
+_ROLE_NAMES = np.array(TILE_ROLES, dtype=object)
+
+
+def role_code(name: str) -> int:
+    """Code for a role name; unknown names map to empty."""
+    return ROLE_CODES.get(name, EMPTY)
+
+
+def empty_roles(height: int, width: int) -> np.ndarray:
+    return np.zeros((height, width), dtype=ROLE_DTYPE)
+
+
+def codes_from_names(names) -> np.ndarray:
+    """Encode a sequence (or nested list) of role names as a uint8 array."""
+    names = np.asarray(names, dtype=object)
+    codes = np.fromiter((role_code(n) for n in names.ravel()), dtype=ROLE_DTYPE, count=names.size)
+    return codes.reshape(names.shape)
+
+
+def names_from_codes(roles: np.ndarray) -> list:
+    """Decode a role layer into nested lists of names for JSON export."""
+    codes = np.clip(roles, 0, len(TILE_ROLES) - 1)
+    return _ROLE_NAMES[codes].tolist()
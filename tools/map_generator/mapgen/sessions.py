@@ -0,0 +1,99 @@
+"""
+Session workspaces.
+Keeps one workspace object per session token so several users can share one
+process. Workspaces are dropped after max_idle seconds without a request, and
+the least recently used ones are evicted while the store is over its memory
+or count limits.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class WorkspaceStore:
+    """Workspaces keyed by token, made on demand by `factory()`.
+
+    A workspace may keep its size in bytes in an `nbytes` attribute for memory
+    accounting, and define close() to release work it still has running when
+    it is dropped. The store only reads `nbytes`, never the workspace's data,
+    so it needs none of the workspace's own locking.
+    """
+    def __init__(self, factory, max_bytes: int = 1024 * 1024 * 1024, max_idle: float = 3600.0,
+                 max_workspaces: int = 64):
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.max_idle = max_idle
+        self.max_workspaces = max_workspaces
+        self.evictions = 0
+        self._items: OrderedDict[str, list] = OrderedDict()   # token -> [workspace, last used]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_or_create(self, token: str | None) -> tuple[str, object, bool]:
+        """(token, workspace, created); unknown or expired tokens get a fresh workspace."""
+        now = time.monotonic()
+        with self._lock:
+            dropped = self._expire(now)
+            item = self._items.get(token) if token else None
+            created = item is None
+            if created:
+                token = secrets.token_urlsafe(18)
+                item = [self.factory(), now]
+                self._items[token] = item
+            else:
+                item[1] = now
+                self._items.move_to_end(token)
+            dropped += self._evict(keep=token)
+        for workspace in dropped:
+            self._close(workspace)
+        return token, item[0], created
+
+    def drop(self, token: str) -> None:
+        with self._lock:
+            item = self._items.pop(token, None)
+        if item is not None:
+            self._close(item[0])
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(self._size(ws) for ws, _ in self._items.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = [self._size(ws) for ws, _ in self._items.values()]
+        return {"workspaces": len(sizes), "nbytes": sum(sizes), "max_bytes": self.max_bytes,
+                "evictions": self.evictions}
+
+    def _expire(self, now: float) -> list:
+        dropped = []
+        for token in [t for t, (_, last) in self._items.items() if now - last > self.max_idle]:
+            dropped.append(self._items.pop(token)[0])
+        return dropped
+
+    def _evict(self, keep: str) -> list:
+        """Pop least recently used workspaces (never `keep`) until under the limits."""
+        dropped = []
+        sizes = {t: self._size(ws) for t, (ws, _) in self._items.items()}
+        total = sum(sizes.values())
+        for token in list(self._items):
+            if total <= self.max_bytes and len(self._items) <= self.max_workspaces:
+                break
+            if token == keep:
+                continue
+            dropped.append(self._items.pop(token)[0])
+            total -= sizes[token]
+            self.evictions += 1
+        return dropped
+
+    @staticmethod
+    def _size(workspace) -> int:
+        return getattr(workspace, "nbytes", 0)
+
+    @staticmethod
+    def _close(workspace) -> None:
+        if hasattr(workspace, "close"):
+            workspace.close()
@@ -0,0 +1,430 @@
+"""
+Wave Function Collapse engine.
+Cell domains are packed bitsets (Python ints, bit i = tile i), the 8-direction
+relations are compiled into per-direction compatibility bit-matrices, the next
+cell to collapse comes from a lazily invalidated entropy heap and every change
+is propagated with a queue-driven arc-consistency pass.
+
+`solve` adds bounded backtracking over an undo trail of decisions, a wall-time
+budget and restarts with fresh seeds, and reports what happened.
+`generate_chunks` solves large maps chunk by chunk and yields them as it goes.
+"""
+
+import heapq
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+DIRECTIONS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+DIR_OFFSETS = {
+    'N': (0, -1), 'NE': (1, -1), 'E': (1, 0), 'SE': (1, 1),
+    'S': (0, 1), 'SW': (-1, 1), 'W': (-1, 0), 'NW': (-1, -1)
+}
+# DIRECTIONS is ordered clockwise, so the opposite direction is 4 steps away
+OPPOSITE = [(i + 4) % 8 for i in range(8)]
+
+# Bound on memoised support sets per direction before the cache is dropped
+_SUPPORT_CACHE_LIMIT = 200_000
+# Seconds between progress reports; each one counts the resolved cells
+PROGRESS_INTERVAL = 0.1
+
+
+class Contradiction(Exception):
+    """Raised when propagation empties a cell's domain."""
+    def __init__(self, cell: int):
+        super().__init__(f"Empty domain at cell {cell}")
+        self.cell = cell
+
+
+class BudgetExceeded(Exception):
+    """Raised when a run passes its wall-time deadline."""
+
+
+class ChunkFailed(Exception):
+    """Raised by generate_chunks when a chunk has no solution and fallback is off."""
+    def __init__(self, x0: int, y0: int, report: dict):
+        super().__init__(f"No solution for the chunk at ({x0}, {y0}): {report}")
+        self.x0, self.y0 = x0, y0
+        self.report = report
+
+
+def compile_relations(tile_relations, n_tiles: int) -> np.ndarray:
+    """Compile relation dicts into an (8, T, T) bool compatibility matrix.
+
+    `tile_relations` maps tile -> direction -> {"allowed": set, "forbidden": set}.
+    compat[d, a, b] is True when tile b may sit in direction d of tile a: the
+    allowed set minus forbidden when something is allowed, otherwise every
+    tile except the forbidden ones. Both sides of each pair must agree, so the
+    result is symmetric under (d, a, b) <-> (opposite d, b, a).
+    """
+    compat = np.ones((8, n_tiles, n_tiles), dtype=bool)
+    for tile, rel in tile_relations.items():
+        if not 0 <= tile < n_tiles:
+            continue
+        for d, direction in enumerate(DIRECTIONS):
+            dir_rel = rel.get(direction)
+            if not dir_rel:
+                continue
+            allowed = [t for t in dir_rel.get("allowed", ()) if 0 <= t < n_tiles]
+            forbidden = [t for t in dir_rel.get("forbidden", ()) if 0 <= t < n_tiles]
+            if allowed:
+                compat[d, tile] = False
+                compat[d, tile, allowed] = True
+            compat[d, tile, forbidden] = False
+    return compat & compat[OPPOSITE].transpose(0, 2, 1)
+
+
+def role_compat(tile_roles: list[str]) -> np.ndarray:
+    """(8, T, T) compatibility where tiles of the same role may touch in every direction."""
+    roles = np.array(tile_roles, dtype=object)
+    same = roles[:, None] == roles[None, :]
+    return np.broadcast_to(same, (8,) + same.shape).copy()
+
+
+def _pack_rows(matrix: np.ndarray) -> list[int]:
+    """Pack each bool row of a (T, T) matrix into an int bitset."""
+    packed = np.packbits(matrix, axis=1, bitorder="little")
+    return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+
+def iter_bits(bits: int):
+    """Yield the indices of set bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class WFCModel:
+    """Compiled tile adjacency rules, reusable across runs."""
+    def __init__(self, compat: np.ndarray, weights=None):
+        self.n_tiles = compat.shape[1]
+        self.full = (1 << self.n_tiles) - 1
+        # rules[d][a] is the bitset of tiles allowed in direction d of tile a
+        self.rules = [_pack_rows(compat[d]) for d in range(8)]
+        self.weights = list(weights) if weights is not None else None
+        self._support = [{} for _ in range(8)]
+
+    @classmethod
+    def from_relations(cls, tile_relations, n_tiles: int, weights=None) -> "WFCModel":
+        return cls(compile_relations(tile_relations, n_tiles), weights)
+
+    @classmethod
+    def from_roles(cls, tile_roles: list[str], weights=None) -> "WFCModel":
+        """Model equivalent to the web app's auto relations (same role, all directions)."""
+        return cls(role_compat(tile_roles), weights)
+
+    def support(self, d: int, domain: int) -> int:
+        """Bitset of tiles allowed in direction d of any tile in `domain`."""
+        cache = self._support[d]
+        result = cache.get(domain)
+        if result is None:
+            rows = self.rules[d]
+            full = self.full
+            result = 0
+            for t in iter_bits(domain):
+                result |= rows[t]
+                if result == full:
+                    break
+            if len(cache) >= _SUPPORT_CACHE_LIMIT:
+                cache.clear()
+            cache[domain] = result
+        return result
+
+
+class WFCSolver:
+    """Single WFC run over a width x height grid.
+    
+    With max_depth > 0 the run is strict: every decision keeps an undo trail of
+    the domains it changed (the last max_depth decisions are kept), and an empty
+    domain rolls back the latest decision and bans its tile. Without it, an
+    empty domain just skips that narrowing and is counted.
+    """
+    def __init__(self, model: WFCModel, width: int, height: int, seed=None,
+                 strict: bool = False, max_depth: int = 0, max_backtracks: int | None = None,
+                 deadline: float | None = None, initial: dict[int, int] | None = None,
+                 progress=None):
+        self.model = model
+        self.width = width
+        self.height = height
+        self.rng = random.Random(seed)
+        self.strict = strict or max_depth > 0
+        self.frames = deque(maxlen=max_depth) if max_depth > 0 else None
+        self.max_backtracks = max_backtracks
+        self.deadline = deadline
+        # progress(resolved cells, total cells), called at most every PROGRESS_INTERVAL
+        self.progress = progress
+        self.contradictions = 0
+        self.backtracks = 0
+        self.domains = [model.full] * (width * height)
+        # Pre-constrained cells: cell index -> domain bitset
+        for cell, domain in (initial or {}).items():
+            self.domains[cell] = domain
+        self.heap = []
+        self.collapsed = 0
+        self._neighbours = self._build_neighbours()
+
+    def _build_neighbours(self) -> list[list[tuple[int, int]]]:
+        """Per cell, the (direction index, neighbour cell) pairs inside the grid."""
+        w, h = self.width, self.height
+        offsets = [DIR_OFFSETS[d] for d in DIRECTIONS]
+        neighbours = []
+        for y in range(h):
+            for x in range(w):
+                row = []
+                for d, (dx, dy) in enumerate(offsets):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < w and 0 <= ny < h:
+                        row.append((d, ny * w + nx))
+                neighbours.append(row)
+        return neighbours
+
+    def _push(self, cell: int) -> None:
+        count = self.domains[cell].bit_count()
+        if count > 1:
+            heapq.heappush(self.heap, (count, self.rng.random(), cell))
+
+    def _pop_min_entropy(self) -> int | None:
+        """Pop the uncollapsed cell with the smallest domain, skipping stale entries."""
+        domains = self.domains
+        heap = self.heap
+        while heap:
+            count, _, cell = heapq.heappop(heap)
+            current = domains[cell].bit_count()
+            if current > 1 and current == count:
+                return cell
+        return None
+
+    def propagate(self, cells) -> None:
+        """Arc-consistency pass starting from the given changed cells."""
+        domains = self.domains
+        neighbours = self._neighbours
+        support = self.model.support
+        trail = self.frames[-1][2] if self.frames else None
+        queue = deque(cells)
+        queued = set(queue)
+        while queue:
+            cell = queue.popleft()
+            queued.discard(cell)
+            domain = domains[cell]
+            for d, n in neighbours[cell]:
+                current = domains[n]
+                narrowed = current & support(d, domain)
+                if narrowed == current:
+                    continue
+                if not narrowed:
+                    if self.strict:
+                        raise Contradiction(n)
+                    self.contradictions += 1
+                    continue
+                if trail is not None:
+                    trail.append((n, current))
+                domains[n] = narrowed
+                self._push(n)
+                if n not in queued:
+                    queued.add(n)
+                    queue.append(n)
+
+    def choose(self, domain: int) -> int:
+        """Pick a tile from a domain, weighted when the model has weights."""
+        options = list(iter_bits(domain))
+        if self.model.weights is None:
+            return self.rng.choice(options)
+        weights = [self.model.weights[t] for t in options]
+        if sum(weights) <= 0:
+            return self.rng.choice(options)
+        return self.rng.choices(options, weights)[0]
+
+    def collapse(self, cell: int, tile: int) -> None:
+        if self.frames is not None:
+            self.frames.append((cell, tile, [(cell, self.domains[cell])]))
+        self.domains[cell] = 1 << tile
+        self.collapsed += 1
+        self.propagate([cell])
+
+    def backtrack(self) -> None:
+        """Undo decisions until banning the last choice leaves a consistent state.
+
+        Raises Contradiction when the kept trail or the backtrack budget runs out.
+        """
+        domains = self.domains
+        while self.frames:
+            if self.max_backtracks is not None and self.backtracks >= self.max_backtracks:
+                break
+            cell, tile, changes = self.frames.pop()
+            self.backtracks += 1
+            self.collapsed -= 1
+            for n, old in reversed(changes):
+                domains[n] = old
+                self._push(n)
+            remaining = domains[cell] & ~(1 << tile)
+            if not remaining:
+                continue
+            # The ban belongs to the parent decision, so record it there
+            if self.frames:
+                self.frames[-1][2].append((cell, domains[cell]))
+            domains[cell] = remaining
+            self._push(cell)
+            try:
+                self.propagate([cell])
+                return
+            except Contradiction:
+                self.contradictions += 1
+        raise Contradiction(-1)
+
+    def run(self) -> np.ndarray:
+        """Collapse every cell and return the (height, width) tile grid."""
+        n_cells = self.width * self.height
+        try:
+            self.propagate(range(n_cells))
+        except Contradiction:
+            # The rules leave some cell with no tile at all
+            self.contradictions += 1
+            raise
+        rng = self.rng
+        self.heap = [(d.bit_count(), rng.random(), i) for i, d in enumerate(self.domains) if d.bit_count() > 1]
+        heapq.heapify(self.heap)
+        deadline = self.deadline
+        progress = self.progress
+        next_report = 0.0
+        while True:
+            if deadline is not None or progress is not None:
+                now = time.perf_counter()
+                if deadline is not None and now > deadline:
+                    raise BudgetExceeded()
+                if progress is not None and now >= next_report:
+                    progress(self.resolved(), n_cells)
+                    next_report = now + PROGRESS_INTERVAL
+            cell = self._pop_min_entropy()
+            if cell is None:
+                break
+            try:
+                self.collapse(cell, self.choose(self.domains[cell]))
+            except Contradiction:
+                self.contradictions += 1
+                if self.frames is None:
+                    raise
+                self.backtrack()
+        if progress is not None:
+            progress(n_cells, n_cells)
+        return self.result()
+
+    def resolved(self) -> int:
+        """Number of cells down to a single tile."""
+        return sum(1 for d in self.domains if not d & (d - 1))
+
+    def result(self) -> np.ndarray:
+        """Tile grid; a cell still holding several options takes its lowest tile."""
+        tiles = np.fromiter(((d & -d).bit_length() - 1 for d in self.domains),
+                            dtype=np.int32, count=len(self.domains))
+        return tiles.reshape(self.height, self.width)
+
+
+def wfc_generate(model: WFCModel, width: int, height: int, seed=None) -> np.ndarray:
+    """Run one WFC pass and return a (height, width) int32 tile grid."""
+    return WFCSolver(model, width, height, seed).run()
+
+
+def _stage(progress, stage: str):
+    """Bind a stage name to a progress(done, total, stage) callback."""
+    if progress is None:
+        return None
+    return lambda done, total: progress(done, total, stage)
+
+
+def solve(model: WFCModel, width: int, height: int, seed=None,
+          max_depth: int = 64, max_backtracks: int = 1000, time_budget: float = 10.0,
+          max_restarts: int = 8, fallback: bool = True,
+          initial: dict[int, int] | None = None, progress=None) -> tuple[np.ndarray | None, dict]:
+    """Run WFC with backtracking, restarting with fresh seeds on failure.
+
+    Each attempt may undo up to max_backtracks decisions (at most max_depth
+    deep) before it is abandoned; time_budget bounds all attempts together.
+    Returns (tiles, report). The report holds success, timed_out, attempts, the
+    seed of the last attempt, contradictions, backtracks and wall_time in seconds.
+    If every attempt fails and `fallback` is set, tiles come from a lenient run
+    that may break relations; otherwise tiles is None. `initial` pre-constrains
+    cells (cell index -> domain bitset) before the first propagation.
+    `progress(resolved, total, stage)` is called periodically during each attempt;
+    an exception raised from it aborts the solve.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget else None
+    seeds = random.Random(seed)
+    report = {"success": False, "timed_out": False, "attempts": 0, "seed": None,
+              "contradictions": 0, "backtracks": 0, "wall_time": 0.0}
+    tiles = None
+    for attempt in range(max_restarts + 1):
+        attempt_seed = seed if attempt == 0 and seed is not None else seeds.getrandbits(32)
+        solver = WFCSolver(model, width, height, attempt_seed, strict=True, max_depth=max_depth,
+                           max_backtracks=max_backtracks, deadline=deadline, initial=initial,
+                           progress=_stage(progress, f"wfc attempt {attempt + 1}"))
+        report["attempts"] += 1
+        report["seed"] = attempt_seed
+        try:
+            tiles = solver.run()
+            report["success"] = True
+        except BudgetExceeded:
+            report["timed_out"] = True
+        except Contradiction:
+            pass
+        report["contradictions"] += solver.contradictions
+        report["backtracks"] += solver.backtracks
+        if report["success"] or report["timed_out"]:
+            break
+    if tiles is None and fallback:
+        tiles = WFCSolver(model, width, height, report["seed"], initial=initial,
+                          progress=_stage(progress, "wfc fallback")).run()
+    report["wall_time"] = time.perf_counter() - start
+    return tiles, report
+
+
+def generate_chunks(model: WFCModel, width: int, height: int, chunk_size: int = 64,
+                    seed=None, overlap: int = 3, **solve_kwargs):
+    """Solve a map chunk by chunk in row-major order.
+
+    Yields (x0, y0, tiles, report) for each chunk as soon as it is solved.
+    Each chunk is solved with a one-cell halo fixed to the already collapsed
+    border of its left, upper-left, upper and upper-right neighbours, and with
+    `overlap` extra free cells to the right and below that are solved and then
+    discarded, so the border it leaves behind can be continued. Only the
+    bottom row of the previous chunk row is kept between chunks, so memory
+    depends on chunk size (plus one map row), not on map size.
+    `solve_kwargs` are passed to `solve` for every chunk; with fallback=False
+    a chunk that can't be solved raises ChunkFailed.
+    """
+    seeds = random.Random(seed)
+    above = None
+    for y0 in range(0, height, chunk_size):
+        ch = min(chunk_size, height - y0)
+        below = np.empty(width, dtype=np.int32)
+        left = None
+        for x0 in range(0, width, chunk_size):
+            cw = min(chunk_size, width - x0)
+            has_top = above is not None
+            has_left = left is not None
+            ox = x0 - 1 if has_left else x0
+            oy = y0 - 1 if has_top else y0
+            x1 = min(x0 + cw + overlap, width)
+            y1 = min(y0 + ch + overlap, height)
+            rw, rh = x1 - ox, y1 - oy
+
+            initial = {}
+            if has_top:
+                for x in range(ox, x1):
+                    initial[x - ox] = 1 << int(above[x])
+            if has_left:
+                for y in range(ch):
+                    initial[(y + y0 - oy) * rw] = 1 << int(left[y])
+
+            tiles, report = solve(model, rw, rh, seed=seeds.getrandbits(32),
+                                  initial=initial, **solve_kwargs)
+            if tiles is None:
+                raise ChunkFailed(x0, y0, report)
+            chunk = tiles[y0 - oy:y0 - oy + ch, x0 - ox:x0 - ox + cw]
+            below[x0:x0 + cw] = chunk[-1]
+            left = chunk[:, -1].copy()
+            yield x0, y0, chunk, report
+        above = below
@@ -3,169 +3,194 @@ Procedural Map Generator - Fixed Version with Zoom
 All features working: drag select, keyboard resize, spacing, offset, zoom, tile preview
 """
 
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, g, render_template_string, request, jsonify, send_file
+from werkzeug.local import LocalProxy
 from PIL import Image
 import numpy as np
+import hashlib
 import json
 import io
+import os
+import sys
 import base64
-import random
+import threading
 from collections import defaultdict
+from types import SimpleNamespace
+
+from mapgen.cellular import DEFAULT_RULE
+from mapgen.core import GameMap, MapGenerator
+from mapgen.jobs import DONE, JobQueue, current_job
+from mapgen.wfc import DIRECTIONS
+from mapgen.cache import GenerationCache, TileRenderCache, fingerprint, relations_fingerprint
+from mapgen.render import build_atlas, composite, dedup_tiles, pack_grid, sheet_tile_ids, slice_grid
+from mapgen.binmap import dump_binary
+from mapgen.mapformat import ENCODINGS, pack_map
+from mapgen.roles import names_from_codes
+from mapgen.sessions import WorkspaceStore
 
 app = Flask(__name__)
 
-# Global state
-DIRECTIONS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-DIR_OFFSETS = {
-    'N': (0, -1), 'NE': (1, -1), 'E': (1, 0), 'SE': (1, 1),
-    'S': (0, 1), 'SW': (-1, 1), 'W': (-1, 0), 'NW': (-1, -1)
-}
+def empty_relations():
+    return {d: {"allowed": set(), "forbidden": set()} for d in DIRECTIONS}
 
-class State:
-    tileset_image = None
-    tile_images = []
-    tile_roles = []
-    tile_width = 16
-    tile_height = 16
-    spacing_x = 0
-    spacing_y = 0
-    offset_x = 0
-    offset_y = 0
-    # 8-directional relations: tile_idx -> direction -> {allowed: set, forbidden: set}
-    tile_relations = defaultdict(lambda: {d: {"allowed": set(), "forbidden": set()} for d in DIRECTIONS})
-    map_width = 40
-    map_height = 25
-    map_data = None
-    map_roles = None
-
-state = State()
-
-ROLE_COLORS = {
-    "empty": (51, 51, 51), "floor": (139, 115, 85), "wall": (74, 74, 74),
-    "decoration": (107, 142, 35), "water": (70, 130, 180), "door": (205, 133, 63),
-    "spawn": (50, 205, 50), "exit": (255, 69, 0)
-}
+# Generated maps by (preset, params, size, seed, tileset/relations fingerprint); the
+# key covers everything generation reads, so workspaces can share it
+generation_cache = GenerationCache(spill_dir=os.environ.get('MAPGEN_CACHE_DIR'))
+# /generate runs here for every workspace
+jobs = JobQueue(max_workers=int(os.environ.get('MAPGEN_WORKERS', 2)))
 
-# ============================================================================
-# GENERATORS
-# ============================================================================
-
-def get_tiles_by_role(role):
-    return [i for i, r in enumerate(state.tile_roles) if r == role]
-
-def generate_bsp(min_room=5, max_room=10, corridor=2):
-    floor_tiles = get_tiles_by_role("floor") or [0]
-    wall_tiles = get_tiles_by_role("wall") or ([1] if len(state.tile_images) > 1 else [0])
+# Per-session state
+class Workspace:
+    """One user's tileset, relations and map.
     
-    state.map_data = np.full((state.map_height, state.map_width), wall_tiles[0] if wall_tiles else 0)
-    state.map_roles = np.full((state.map_height, state.map_width), "wall", dtype=object)
+    Requests for a workspace run one at a time under `lock`; finished jobs
+    take it too before swapping in their map. `nbytes` is refreshed under the
+    lock after every change so the store can size workspaces without it.
+    """
+    def __init__(self):
+        # Sliced tiles as one (N, tile_height, tile_width, 4) uint8 array
+        self.tile_images = np.zeros((0, 16, 16, 4), dtype=np.uint8)
+        self.tile_columns = 0
+        # Sheet cell of each kept tile, and each sheet cell's tile (-1 if dropped)
+        self.tile_cells = np.zeros(0, dtype=np.int32)
+        self.cell_tiles = np.zeros(0, dtype=np.int32)
+        self.tile_roles = []
+        self.tile_weights = []
+        self.tile_width = 16
+        self.tile_height = 16
+        self.spacing_x = 0
+        self.spacing_y = 0
+        self.offset_x = 0
+        self.offset_y = 0
+        # 8-directional relations: tile_idx -> direction -> {allowed: set, forbidden: set}
+        self.tile_relations = defaultdict(empty_relations)
+        self.map_width = 40
+        self.map_height = 25
+        self.map_data = None
+        self.map_roles = None
+        # Scaled tile pixels for previews, cleared on /slice
+        self.render_cache = TileRenderCache()
+        # Stacked preview atlases by cell size, filled from render_cache; cleared on /slice
+        self.preview_atlases = {}
+        # PNG of the tiles packed tile_columns per row, built on first request
+        self.atlas_png = None
+        self.atlas_digest = None
+        self.job_ids = set()
+        # Id of the job whose map the workspace should show; older jobs don't install theirs
+        self.current_job = None
+        self.lock = threading.RLock()
+        self.nbytes = 0
     
-    rooms = []
-    
-    def split(x, y, w, h, depth=0):
-        if depth > 4 or w < min_room * 2 or h < min_room * 2:
-            max_w = max(min_room, min(max_room, w - 2))
-            max_h = max(min_room, min(max_room, h - 2))
-            if max_w >= min_room and max_h >= min_room:
-                rw = random.randint(min_room, max_w)
-                rh = random.randint(min_room, max_h)
-                rx = x + random.randint(0, max(0, w - rw - 1))
-                ry = y + random.randint(0, max(0, h - rh - 1))
-                rooms.append((rx, ry, rw, rh))
-            return
+    def measure(self) -> int:
+        """Approximate memory held: tiles, atlas, map layers, preview cache and relations.
         
-        if random.random() > 0.5 and w > min_room * 2:
-            s = random.randint(w // 3, 2 * w // 3)
-            split(x, y, s, h, depth + 1)
-            split(x + s, y, w - s, h, depth + 1)
-        elif h > min_room * 2:
-            s = random.randint(h // 3, 2 * h // 3)
-            split(x, y, w, s, depth + 1)
-            split(x, y + s, w, h - s, depth + 1)
-    
-    split(0, 0, state.map_width, state.map_height)
+        Call with `lock` held; relations change under it.
+        """
+        total = self.render_cache.nbytes + self.tile_images.nbytes + len(self.atlas_png or b'')
+        total += self.tile_cells.nbytes + self.cell_tiles.nbytes
+        total += sum(atlas.nbytes for atlas in self.preview_atlases.values())
+        for layer in (self.map_data, self.map_roles):
+            if layer is not None:
+                total += layer.nbytes
+        total += sum(sys.getsizeof(s) for dirs in self.tile_relations.values()
+                     for rel in dirs.values() for s in rel.values())
+        return total
     
-    for rx, ry, rw, rh in rooms:
-        for py in range(ry, min(ry + rh, state.map_height)):
-            for px in range(rx, min(rx + rw, state.map_width)):
-                state.map_data[py, px] = random.choice(floor_tiles)
-                state.map_roles[py, px] = "floor"
+    def update_nbytes(self):
+        self.nbytes = self.measure()
     
-    for i in range(len(rooms) - 1):
-        r1, r2 = rooms[i], rooms[i + 1]
-        cx1, cy1 = r1[0] + r1[2] // 2, r1[1] + r1[3] // 2
-        cx2, cy2 = r2[0] + r2[2] // 2, r2[1] + r2[3] // 2
-        
-        for x in range(min(cx1, cx2), max(cx1, cx2) + 1):
-            for w in range(corridor):
-                if 0 <= cy1 + w < state.map_height and 0 <= x < state.map_width:
-                    state.map_data[cy1 + w, x] = random.choice(floor_tiles)
-                    state.map_roles[cy1 + w, x] = "floor"
-        
-        for y in range(min(cy1, cy2), max(cy1, cy2) + 1):
-            for w in range(corridor):
-                if 0 <= cx2 + w < state.map_width and 0 <= y < state.map_height:
-                    state.map_data[y, cx2 + w] = random.choice(floor_tiles)
-                    state.map_roles[y, cx2 + w] = "floor"
-
-def generate_caves(fill=0.45, iterations=5):
-    floor_tiles = get_tiles_by_role("floor") or [0]
-    wall_tiles = get_tiles_by_role("wall") or ([1] if len(state.tile_images) > 1 else [0])
-    
-    state.map_roles = np.full((state.map_height, state.map_width), "empty", dtype=object)
-    
-    for y in range(state.map_height):
-        for x in range(state.map_width):
-            if x == 0 or y == 0 or x == state.map_width - 1 or y == state.map_height - 1:
-                state.map_roles[y, x] = "wall"
-            elif random.random() < fill:
-                state.map_roles[y, x] = "wall"
-            else:
-                state.map_roles[y, x] = "floor"
-    
-    for _ in range(iterations):
-        new = state.map_roles.copy()
-        for y in range(1, state.map_height - 1):
-            for x in range(1, state.map_width - 1):
-                walls = sum(1 for dy in [-1, 0, 1] for dx in [-1, 0, 1]
-                            if state.map_roles[y + dy, x + dx] == "wall")
-                new[y, x] = "wall" if walls > 4 else "floor"
-        state.map_roles = new
-    
-    state.map_data = np.zeros((state.map_height, state.map_width), dtype=int)
-    for y in range(state.map_height):
-        for x in range(state.map_width):
-            state.map_data[y, x] = random.choice(wall_tiles if state.map_roles[y, x] == "wall" else floor_tiles)
+    def close(self):
+        """Stop this workspace's jobs when it is evicted."""
+        for job_id in self.job_ids:
+            jobs.cancel(job_id)
+
+SESSION_COOKIE = 'mapgen_workspace'
+workspaces = WorkspaceStore(Workspace,
+                            max_bytes=int(os.environ.get('MAPGEN_WORKSPACE_BYTES', 1024 * 1024 * 1024)),
+                            max_idle=float(os.environ.get('MAPGEN_WORKSPACE_IDLE', 3600)))
+# The current request's workspace
+state = LocalProxy(lambda: g.workspace)
+
+@app.before_request
+def open_workspace():
+    """Find the caller's workspace by X-Workspace header or cookie, creating one if needed."""
+    token = request.headers.get('X-Workspace') or request.cookies.get(SESSION_COOKIE)
+    g.workspace_token, workspace, g.workspace_created = workspaces.get_or_create(token)
+    workspace.lock.acquire()
+    g.workspace = workspace
+
+@app.teardown_request
+def close_workspace(exc):
+    workspace = g.pop('workspace', None)
+    if workspace is not None:
+        try:
+            workspace.update_nbytes()
+        finally:
+            workspace.lock.release()
+
+@app.after_request
+def send_workspace_token(response):
+    if 'workspace_token' in g:
+        response.headers['X-Workspace'] = g.workspace_token
+        if g.workspace_created:
+            response.set_cookie(SESSION_COOKIE, g.workspace_token, httponly=True, samesite='Lax')
+    return response
 
-def get_map_b64():
-    if state.map_data is None:
-        return ""
+# ============================================================================
+# GENERATORS
+# ============================================================================
+
+def snapshot(width, height):
+    """What a generation job reads from state, copied so edits made while it runs can't race it.
     
+    It has tile_roles/tile_weights, all the algorithms read from a tileset.
+    """
+    return SimpleNamespace(width=width, height=height,
+                           tile_roles=list(state.tile_roles), tile_weights=list(state.tile_weights),
+                           tile_relations={t: {d: {k: set(v) for k, v in rel.items()} for d, rel in dirs.items()}
+                                           for t, dirs in state.tile_relations.items()})
+
+def run_generator(generator, spec, seed=None, **params):
+    """Run a core MapGenerator algorithm for a snapshot; returns (GameMap, report)."""
+    game_map = GameMap(spec.width, spec.height)
+    report = generator(game_map, spec, seed=seed, **params)
+    return game_map, report
+
+def generate_bsp(spec, min_room=5, max_room=10, corridor=2, seed=None, progress=None):
+    return run_generator(MapGenerator.bsp_dungeon, spec, seed, min_room_size=min_room,
+                         max_room_size=max_room, corridor_width=corridor)
+
+def generate_caves(spec, fill=0.45, iterations=5, rule=DEFAULT_RULE, seed=None, progress=None):
+    return run_generator(MapGenerator.cellular_automata, spec, seed, fill_chance=fill,
+                         iterations=iterations, rule=rule, progress=progress)
+
+def generate_city(spec, block_size=8, street_width=2, jitter=0, alley_chance=0.0, seed=None, progress=None):
+    return run_generator(MapGenerator.grid_city, spec, seed, block_size=block_size, street_width=street_width,
+                         jitter=jitter, alley_chance=alley_chance)
+
+def preview_atlas(cell):
+    """The tiles stacked at cell x cell, built once per tileset and cell size."""
+    atlas = state.preview_atlases.get(cell)
+    if atlas is None:
+        atlas = state.preview_atlases[cell] = build_atlas(state.tile_images, cell, cache=state.render_cache)
+    return atlas
+
+def render_b64(tiles, roles):
+    """PNG preview of a tile grid as base64."""
     cell = 16
-    w = state.map_width * cell
-    h = state.map_height * cell
-    
-    img = Image.new('RGBA', (w, h), (40, 40, 40, 255))
-    
-    for y in range(state.map_height):
-        for x in range(state.map_width):
-            tile_idx = int(state.map_data[y, x])
-            px, py = x * cell, y * cell
-            
-            if 0 <= tile_idx < len(state.tile_images):
-                tile_img = state.tile_images[tile_idx].resize((cell, cell), Image.Resampling.NEAREST)
-                img.paste(tile_img, (px, py), tile_img if tile_img.mode == 'RGBA' else None)
-            else:
-                role = state.map_roles[y, x]
-                color = ROLE_COLORS.get(role, (51, 51, 51))
-                for dy in range(cell):
-                    for dx in range(cell):
-                        img.putpixel((px + dx, py + dy), color + (255,))
+    atlas = preview_atlas(cell)
+    pixels = composite(tiles, roles, atlas, len(state.tile_images))
+    img = Image.fromarray(pixels, 'RGBA')
     
     buf = io.BytesIO()
     img.save(buf, 'PNG')
     return base64.b64encode(buf.getvalue()).decode()
 
+def get_map_b64():
+    if state.map_data is None:
+        return ""
+    return render_b64(state.map_data, state.map_roles)
+
 # ============================================================================
 # HTML
 # ============================================================================
@@ -194,7 +219,7 @@ HTML = '''
         #selectBox { position: absolute; border: 2px dashed #0f0; background: rgba(0,255,0,0.1); display: none; pointer-events: none; }
         
         .tiles { display: flex; flex-wrap: wrap; gap: 2px; max-height: 150px; overflow-y: auto; background: #0a0a0a; padding: 5px; border-radius: 4px; margin-top: 5px; }
-        .tile { width: 32px; height: 32px; border: 2px solid #333; cursor: pointer; background-size: contain; }
+        .tile { width: 32px; height: 32px; border: 2px solid #333; cursor: pointer; background-repeat: no-repeat; image-rendering: pixelated; }
         .tile:hover { border-color: #0df; }
         .tile.sel { border-color: #0f0; box-shadow: 0 0 5px #0f0; }
         
@@ -212,7 +237,7 @@ HTML = '''
         
         /* 8-direction node tile */
         .dir-node { position: relative; width: 80px; height: 80px; background: #1a1a2e; border: 2px solid #333; border-radius: 8px; margin: 10px; display: inline-block; }
-        .dir-node .tile-img { position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); width: 32px; height: 32px; background-size: cover; border-radius: 4px; cursor: pointer; border: 2px solid #555; }
+        .dir-node .tile-img { position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); width: 32px; height: 32px; background-repeat: no-repeat; image-rendering: pixelated; border-radius: 4px; cursor: pointer; border: 2px solid #555; }
         .dir-node .tile-img:hover { border-color: #00d4ff; }
         .dir-node .tile-img.selected { border-color: #e94560; box-shadow: 0 0 8px rgba(233,69,96,0.7); }
         .dir-connector { position: absolute; width: 14px; height: 14px; background: #444; border: 2px solid #666; border-radius: 50%; cursor: pointer; font-size: 8px; color: #888; display: flex; align-items: center; justify-content: center; transition: all 0.15s; }
@@ -236,7 +261,7 @@ HTML = '''
         .dir-panel { background: #0a0a1a; border: 1px solid #333; border-radius: 6px; padding: 10px; margin-top: 8px; }
         .dir-panel h4 { color: #00d4ff; font-size: 12px; margin: 0 0 8px 0; }
         .dir-tiles { display: flex; flex-wrap: wrap; gap: 3px; max-height: 100px; overflow-y: auto; }
-        .dir-tile { width: 28px; height: 28px; border: 2px solid #333; cursor: pointer; background-size: cover; border-radius: 3px; }
+        .dir-tile { width: 28px; height: 28px; border: 2px solid #333; cursor: pointer; background-repeat: no-repeat; image-rendering: pixelated; border-radius: 3px; }
         .dir-tile:hover { border-color: #00d4ff; }
         .dir-tile.allowed { border-color: #2ecc71; box-shadow: 0 0 4px #2ecc71; }
         .dir-tile.forbidden { border-color: #e74c3c; box-shadow: 0 0 4px #e74c3c; }
@@ -315,9 +340,13 @@ HTML = '''
                     <option value="sewer">Sewer</option>
                     <option value="office">Office</option>
                     <option value="caves">Caves</option>
+                    <option value="urban">Urban</option>
                 </select>
+                <label>Seed:</label><input type="number" id="seed" placeholder="random" style="width:80px;">
                 <button onclick="generate()">Generate</button>
+                <button id="cancelBtn" onclick="cancelGenerate()" disabled>Cancel</button>
                 <button onclick="exportJSON()">Export JSON</button>
+                <button onclick="exportJSON(true)">Export Compact</button>
             </div>
             <canvas id="mapCanvas" width="480" height="320"></canvas>
         </div>
@@ -357,6 +386,7 @@ let img = null;
 let zoom = 1;
 let panX = 0, panY = 0;
 let tiles = [];
+let atlas = null; // {url, columns, rows}: every sliced tile in one image
 let selTile = 0;
 let selectedTiles = new Set(); // Multi-select for role assignment
 
@@ -588,9 +618,11 @@ async function sliceTiles() {
     const data = await resp.json();
     if (data.error) return alert(data.error);
     
-    tiles = data.tiles;
+    atlas = {url: data.atlas, columns: data.columns, rows: data.atlas_rows};
+    tiles = data.roles.map(role => ({role}));
     renderTiles();
-    status(`Sliced ${tiles.length} tiles`);
+    const dropped = data.remap.filter(t => t < 0).length;
+    status(`Sliced ${tiles.length} distinct tiles from ${data.remap.length} cells (${dropped} blank)`);
 }
 
 function renderTiles() {
@@ -602,7 +634,7 @@ function renderTiles() {
         if (selectedTiles.has(i)) classes += ' multi-sel';
         if (i === selTile) classes += ' sel';
         d.className = classes;
-        d.style.backgroundImage = `url(data:image/png;base64,${t.img})`;
+        drawTile(d, i, 28);
         d.style.backgroundColor = roleColor(t.role);
         d.title = `#${i}: ${t.role}`;
         d.onclick = (e) => {
@@ -658,6 +690,13 @@ function clearSelection() {
     renderTiles();
 }
 
+// Show tile i as a size x size sprite cut from the atlas
+function drawTile(el, i, size) {
+    el.style.backgroundImage = `url(${atlas.url})`;
+    el.style.backgroundSize = `${atlas.columns * size}px ${atlas.rows * size}px`;
+    el.style.backgroundPosition = `-${(i % atlas.columns) * size}px -${Math.floor(i / atlas.columns) * size}px`;
+}
+
 function roleColor(r) {
     const c = {empty:'#333',floor:'#8b7355',wall:'#4a4a4a',decoration:'#6b8e23',water:'#4682b4',door:'#cd853f',spawn:'#32cd32',exit:'#f45'};
     return c[r] || '#333';
@@ -671,6 +710,87 @@ let currentRelTile = 0;
 let currentDirection = 'N';
 let allRelations8 = {};
 
+// Relations for one tile: direction -> {allowed: Set, forbidden: Set}
+function emptyRelations8() {
+    const rels = {};
+    DIRECTIONS.forEach(d => rels[d] = {allowed: new Set(), forbidden: new Set()});
+    return rels;
+}
+
+function relationsOf(tileIdx) {
+    if (!allRelations8[tileIdx]) allRelations8[tileIdx] = emptyRelations8();
+    return allRelations8[tileIdx];
+}
+
+// Load tile -> relations from /relations8 matrices (pair lists or packed bits)
+function unpackRelations(data) {
+    allRelations8 = {};
+    const n = data.count;
+    DIRECTIONS.forEach(dir => {
+        ['allowed', 'forbidden'].forEach(type => {
+            const m = data.relations[dir][type];
+            if (m.pairs) {
+                for (let k = 0; k < m.pairs.length; k += 2) relationsOf(m.pairs[k])[dir][type].add(m.pairs[k + 1]);
+            } else {
+                const bytes = atob(m.bits);
+                for (let k = 0; k < bytes.length; k++) {
+                    const b = bytes.charCodeAt(k);
+                    if (!b) continue;
+                    for (let j = 0; j < 8; j++) {
+                        if (!(b & (128 >> j))) continue;
+                        const cell = k * 8 + j;
+                        relationsOf(Math.floor(cell / n))[dir][type].add(cell % n);
+                    }
+                }
+            }
+        });
+    });
+}
+
+// Toggles apply locally at once and reach the server in batches
+let pendingRelationOps = [];
+let relationFlushTimer = null;
+
+function queueRelationToggle(source, target, direction, type) {
+    const rel = relationsOf(source)[direction];
+    const opposite = type === 'allowed' ? 'forbidden' : 'allowed';
+    if (rel[type].has(target)) {
+        rel[type].delete(target);
+    } else {
+        rel[type].add(target);
+        rel[opposite].delete(target);
+    }
+    pendingRelationOps.push({source, target, direction, type});
+    clearTimeout(relationFlushTimer);
+    relationFlushTimer = setTimeout(flushRelationOps, 150);
+}
+
+async function flushRelationOps() {
+    clearTimeout(relationFlushTimer);
+    if (pendingRelationOps.length === 0) return;
+    const ops = pendingRelationOps;
+    pendingRelationOps = [];
+    const resp = await fetch('/relations8/batch', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ops})
+    });
+    const data = await resp.json();
+    if (data.error) return status(data.error);
+    // Take the server's state for the touched tiles, unless newer clicks are still queued
+    const queued = new Set(pendingRelationOps.map(o => o.source));
+    Object.entries(data.relations).forEach(([src, rels]) => {
+        if (queued.has(+src)) return;
+        const mine = relationsOf(+src);
+        DIRECTIONS.forEach(d => {
+            mine[d].allowed = new Set(rels[d].allowed);
+            mine[d].forbidden = new Set(rels[d].forbidden);
+        });
+    });
+    renderDirTiles();
+    updateAllConnectorStates();
+}
+
 function showTab(tab) {
     document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
     event.target.classList.add('active');
@@ -700,12 +820,10 @@ async function initRelations8Dir() {
     const container = document.getElementById('tileNodesContainer');
     container.innerHTML = '';
     
-    // Fetch all 8-directional relations
-    allRelations8 = {};
-    for (let i = 0; i < tiles.length; i++) {
-        const resp = await fetch(`/get_relations8/${i}`);
-        allRelations8[i] = await resp.json();
-    }
+    // Fetch all 8-directional relations in one request
+    await flushRelationOps();
+    const resp = await fetch('/relations8');
+    unpackRelations(await resp.json());
     
     // Create tile nodes with 8 direction connectors
     tiles.forEach((t, i) => {
@@ -715,7 +833,7 @@ async function initRelations8Dir() {
         // Center tile image
         const tileImg = document.createElement('div');
         tileImg.className = 'tile-img';
-        tileImg.style.backgroundImage = `url(data:image/png;base64,${t.img})`;
+        drawTile(tileImg, i, 28);
         tileImg.title = `Tile ${i} (${t.role})`;
         tileImg.onclick = () => {
             document.querySelectorAll('.dir-node .tile-img').forEach(el => el.classList.remove('selected'));
@@ -750,15 +868,14 @@ async function initRelations8Dir() {
 }
 
 function updateConnectorStates(node, tileIdx) {
-    const rels = allRelations8[tileIdx] || {};
+    const rels = relationsOf(tileIdx);
     DIRECTIONS.forEach(dir => {
         const conn = node.querySelector(`.dir-connector.${dir}`);
         if (!conn) return;
         
         conn.classList.remove('has-allowed', 'has-forbidden', 'has-both', 'active');
-        const dirRels = rels[dir] || {allowed: [], forbidden: []};
-        const hasAllowed = dirRels.allowed && dirRels.allowed.length > 0;
-        const hasForbidden = dirRels.forbidden && dirRels.forbidden.length > 0;
+        const hasAllowed = rels[dir].allowed.size > 0;
+        const hasForbidden = rels[dir].forbidden.size > 0;
         
         if (hasAllowed && hasForbidden) conn.classList.add('has-both');
         else if (hasAllowed) conn.classList.add('has-allowed');
@@ -797,39 +914,28 @@ function renderDirTiles() {
     const container = document.getElementById('dirTilesContainer');
     container.innerHTML = '';
     
-    const rels = allRelations8[currentRelTile] || {};
-    const dirRels = rels[currentDirection] || {allowed: [], forbidden: []};
+    const dirRels = relationsOf(currentRelTile)[currentDirection];
     
     tiles.forEach((t, i) => {
         const tile = document.createElement('div');
         tile.className = 'dir-tile';
-        tile.style.backgroundImage = `url(data:image/png;base64,${t.img})`;
+        drawTile(tile, i, 24);
         tile.title = `Tile ${i} (${t.role}) - Left click: Allow, Right click: Forbid`;
         
-        if (dirRels.allowed && dirRels.allowed.includes(i)) tile.classList.add('allowed');
-        if (dirRels.forbidden && dirRels.forbidden.includes(i)) tile.classList.add('forbidden');
+        if (dirRels.allowed.has(i)) tile.classList.add('allowed');
+        if (dirRels.forbidden.has(i)) tile.classList.add('forbidden');
         
         // Left click = allow
-        tile.onclick = async () => {
-            await fetch('/toggle_relation8', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({source: currentRelTile, target: i, direction: currentDirection, type: 'allowed'})
-            });
-            await refreshRelations(currentRelTile);
+        tile.onclick = () => {
+            queueRelationToggle(currentRelTile, i, currentDirection, 'allowed');
             renderDirTiles();
             updateAllConnectorStates();
         };
         
         // Right click = forbid
-        tile.oncontextmenu = async (e) => {
+        tile.oncontextmenu = (e) => {
             e.preventDefault();
-            await fetch('/toggle_relation8', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({source: currentRelTile, target: i, direction: currentDirection, type: 'forbidden'})
-            });
-            await refreshRelations(currentRelTile);
+            queueRelationToggle(currentRelTile, i, currentDirection, 'forbidden');
             renderDirTiles();
             updateAllConnectorStates();
         };
@@ -838,27 +944,24 @@ function renderDirTiles() {
     });
 }
 
-async function refreshRelations(tileIdx) {
-    const resp = await fetch(`/get_relations8/${tileIdx}`);
-    allRelations8[tileIdx] = await resp.json();
-}
-
 function updateAllConnectorStates() {
     const nodes = document.querySelectorAll('.dir-node');
     nodes.forEach((node, i) => updateConnectorStates(node, i));
 }
 
 async function autoRelations8Dir() {
+    await flushRelationOps();
     await fetch('/auto_relations8', {method: 'POST'});
     status('Auto-set relations for all directions');
     initRelations8Dir();
 }
 
-function clearAllRelations() {
-    fetch('/clear_relations', {method: 'POST'}).then(() => {
-        status('Cleared all relations');
-        initRelations8Dir();
-    });
+async function clearAllRelations() {
+    // Send queued toggles first so they can't land after the clear
+    await flushRelationOps();
+    await fetch('/clear_relations', {method: 'POST'});
+    status('Cleared all relations');
+    initRelations8Dir();
 }
 
 function toggleRelation(target, type) {
@@ -867,36 +970,53 @@ function toggleRelation(target, type) {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify({source: selTile, target: target, type: type})
-    }).then(() => initRelationCanvas());
+    }).then(() => initRelations8Dir());
 }
 
 function autoRelations() {
     fetch('/auto_relations', {method: 'POST'}).then(r => r.json()).then(d => {
         status(d.message);
-        initRelationCanvas();
-    });
-}
-
-function clearAllRelations() {
-    fetch('/clear_relations', {method: 'POST'}).then(() => {
-        status('Cleared all relations');
-        initRelationCanvas();
+        initRelations8Dir();
     });
 }
 
 // Generate
 async function generate() {
     if (tiles.length === 0) return alert('Slice tiles first');
+    // Queued relation clicks must reach the server before it reads relations for WFC
+    await flushRelationOps();
+    // A new run replaces the one in progress
+    await cancelGenerate();
+    currentJob = null;
     const resp = await fetch('/generate', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify({
             preset: document.getElementById('preset').value,
             width: parseInt(document.getElementById('mapW').value),
-            height: parseInt(document.getElementById('mapH').value)
+            height: parseInt(document.getElementById('mapH').value),
+            seed: document.getElementById('seed').value === '' ? null : parseInt(document.getElementById('seed').value)
         })
     });
-    const data = await resp.json();
+    const started = await resp.json();
+    if (started.error) return status(started.error);
+    
+    // Poll the job until it finishes; the server stays free for other requests meanwhile
+    currentJob = started.job;
+    document.getElementById('cancelBtn').disabled = false;
+    let data;
+    while (true) {
+        if (currentJob !== started.job) return; // Superseded by a newer Generate
+        data = await (await fetch('/jobs/' + started.job)).json();
+        if (['done', 'failed', 'cancelled'].includes(data.status) || data.error) break;
+        const pct = data.total ? Math.floor(100 * data.done / data.total) : 0;
+        status(`Generating (seed ${started.seed})... ${data.stage} ${data.done}/${data.total} (${pct}%)`);
+        await new Promise(r => setTimeout(r, 200));
+    }
+    if (currentJob !== started.job) return;
+    currentJob = null;
+    document.getElementById('cancelBtn').disabled = true;
+    if (data.status !== 'done') return status(data.status === 'cancelled' ? 'Generation cancelled' : `Generation failed: ${data.error}`);
     
     const mapCanvas = document.getElementById('mapCanvas');
     const mctx = mapCanvas.getContext('2d');
@@ -908,10 +1028,22 @@ async function generate() {
         mctx.drawImage(mapImg, 0, 0);
     };
     mapImg.src = 'data:image/png;base64,' + data.image;
-    status('Map generated!');
+    const seedInfo = `seed ${data.seed}${data.cached ? ', cached' : ''}`;
+    if (data.report) {
+        const r = data.report;
+        status(`Map generated (${seedInfo})! WFC ${r.success ? 'solved' : 'FAILED (relations broken)'} in ${r.wall_time.toFixed(2)}s | ` +
+               `${r.attempts} attempt(s), ${r.contradictions} contradictions, ${r.backtracks} backtracks`);
+    } else {
+        status(`Map generated (${seedInfo})!`);
+    }
+}
+
+let currentJob = null;
+async function cancelGenerate() {
+    if (currentJob) await fetch('/jobs/' + currentJob + '/cancel', {method: 'POST'});
 }
 
-function exportJSON() { window.location = '/export'; }
+function exportJSON(compact) { window.location = compact ? '/export?compact=1&encoding=base64&zlib=1' : '/export'; }
 function status(msg) { document.getElementById('status').textContent = '✅ ' + msg; }
 </script>
 </body>
@@ -928,6 +1060,11 @@ def index():
 
 @app.route('/slice', methods=['POST'])
 def slice_tileset():
+    """Cut the uploaded sheet into distinct tiles; the browser draws them from /atlas/<digest>.png.
+    
+    Blank cells are dropped and duplicates share one tile unless the form sets
+    dedup=0; `cells` and `remap` relate tile ids to sheet cells.
+    """
     try:
         file = request.files['file']
         tw = int(request.form.get('tw', 16))
@@ -936,40 +1073,65 @@ def slice_tileset():
         sy = int(request.form.get('sy', 0))
         ox = int(request.form.get('ox', 0))
         oy = int(request.form.get('oy', 0))
+        dedup = request.form.get('dedup', '1') != '0'
+        
+        pixels = np.asarray(Image.open(file).convert('RGBA'))
+        grid = slice_grid(pixels, tw, th, spacing=(sx, sy), offset=(ox, oy))
+        rows, cols = grid.shape[:2]
+        if rows * cols == 0:
+            return jsonify({'error': 'No whole tile fits the sheet with these settings'})
+        tiles = grid.reshape(rows * cols, th, tw, 4)
+        if dedup:
+            cells, remap = dedup_tiles(tiles)
+            if len(cells) == 0:
+                return jsonify({'error': 'Every tile is blank'})
+        else:
+            cells = remap = np.arange(rows * cols, dtype=np.int32)
         
-        img = Image.open(file).convert('RGBA')
-        state.tileset_image = img
         state.tile_width = tw
         state.tile_height = th
         state.spacing_x = sx
         state.spacing_y = sy
         state.offset_x = ox
         state.offset_y = oy
-        state.tile_images = []
-        state.tile_roles = []
-        
-        step_x = tw + sx
-        step_y = th + sy
-        
-        tiles_data = []
-        y = oy
-        while y + th <= img.height:
-            x = ox
-            while x + tw <= img.width:
-                tile = img.crop((x, y, x + tw, y + th))
-                state.tile_images.append(tile)
-                state.tile_roles.append("empty")
-                
-                buf = io.BytesIO()
-                tile.save(buf, 'PNG')
-                tiles_data.append({'img': base64.b64encode(buf.getvalue()).decode(), 'role': 'empty'})
-                x += step_x
-            y += step_y
+        state.tile_cells, state.cell_tiles = cells, remap
+        # One copy of just the distinct tile pixels; the sheet itself is not kept
+        state.tile_images = np.ascontiguousarray(tiles[cells])
+        state.tile_columns = cols
+        state.tile_roles = ["empty"] * len(state.tile_images)
+        state.tile_weights = [1.0] * len(state.tile_images)
+        state.render_cache.clear()
+        state.preview_atlases = {}
+        # Tile ids of the old map and of running jobs refer to the previous tiles
+        state.current_job = None
+        state.map_data = state.map_roles = None
+        state.atlas_png = None
+        # The URL is cached as immutable, so the digest covers the layout as well as the pixels
+        layout = f'{state.tile_images.shape} columns={cols}'
+        state.atlas_digest = hashlib.sha1(layout.encode() + state.tile_images.tobytes()).hexdigest()[:16]
         
-        return jsonify({'tiles': tiles_data})
+        count = len(cells)
+        return jsonify({'count': count, 'columns': cols, 'rows': rows,
+                        'tile_width': tw, 'tile_height': th,
+                        'atlas': f'/atlas/{state.atlas_digest}.png', 'atlas_rows': -(-count // cols),
+                        'cells': cells.tolist(), 'remap': remap.tolist(), 'roles': state.tile_roles})
     except Exception as e:
         return jsonify({'error': str(e)})
 
+@app.route('/atlas/<digest>.png')
+def tile_atlas(digest):
+    """The sliced tiles packed `columns` per row with no spacing; tile i is at (i % columns, i // columns)."""
+    if digest != state.atlas_digest:
+        return jsonify({'error': 'Unknown atlas'}), 404
+    if state.atlas_png is None:
+        buf = io.BytesIO()
+        Image.fromarray(pack_grid(state.tile_images, state.tile_columns), 'RGBA').save(buf, 'PNG')
+        state.atlas_png = buf.getvalue()
+    response = send_file(io.BytesIO(state.atlas_png), mimetype='image/png')
+    # The URL names the content, so browsers may keep it for good
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
 @app.route('/set_role', methods=['POST'])
 def set_role():
     data = request.json
@@ -989,18 +1151,96 @@ def set_roles_batch():
             state.tile_roles[idx] = role
     return jsonify({'ok': True, 'count': len(indices)})
 
+@app.route('/set_weights_batch', methods=['POST'])
+def set_weights_batch():
+    """Set the variant weight for multiple tiles at once."""
+    data = request.json
+    indices = data.get('indices', [])
+    weight = float(data.get('weight', 1.0))
+    for idx in indices:
+        if 0 <= idx < len(state.tile_weights):
+            state.tile_weights[idx] = weight
+    return jsonify({'ok': True, 'count': len(indices)})
+
+RELATION_TYPES = ('allowed', 'forbidden')
+
+def relations_of(idx):
+    """One tile's relations as {direction: {allowed: [...], forbidden: [...]}}."""
+    rel = state.tile_relations.get(idx) or empty_relations()
+    return {d: {t: sorted(rel[d][t]) for t in RELATION_TYPES} for d in DIRECTIONS}
+
+def pack_relation_matrix(flat, count):
+    """Set cells (source * count + target) of one count x count matrix, in its smaller JSON form.
+    
+    Sparse matrices are {'pairs': [source, target, ...]}; dense ones are
+    {'bits': base64 of np.packbits over the row-major matrix}.
+    """
+    flat = np.unique(flat)
+    # ~10 JSON bytes per pair against 4/3 base64 bytes per 8 cells
+    if len(flat) * 10 <= count * count // 6:
+        return {'pairs': np.stack([flat // count, flat % count], axis=1).ravel().tolist()}
+    bits = np.zeros(count * count, dtype=bool)
+    bits[flat] = True
+    return {'bits': base64.b64encode(np.packbits(bits).tobytes()).decode()}
+
+def pack_relations():
+    """Every tile's relations as per-direction allowed/forbidden matrices, see pack_relation_matrix."""
+    count = len(state.tile_images)
+    cells = {(d, t): [] for d in DIRECTIONS for t in RELATION_TYPES}
+    for source, dirs in state.tile_relations.items():
+        if not 0 <= source < count:
+            continue
+        for (d, t), out in cells.items():
+            if dirs[d][t]:
+                targets = np.fromiter(dirs[d][t], dtype=np.int64, count=len(dirs[d][t]))
+                out.append(source * count + targets[(targets >= 0) & (targets < count)])
+    return {'count': count,
+            'relations': {d: {t: pack_relation_matrix(np.concatenate(cells[d, t] or [np.zeros(0, np.int64)]), count)
+                              for t in RELATION_TYPES} for d in DIRECTIONS}}
+
+def apply_relation_op(source, target, direction, rel_type, op='toggle'):
+    """Add, remove or toggle target in source's allowed/forbidden set for a direction.
+    
+    Adding to one set removes the target from the other.
+    """
+    rel = state.tile_relations[source][direction]
+    if op == 'remove' or (op == 'toggle' and target in rel[rel_type]):
+        rel[rel_type].discard(target)
+    else:
+        rel[rel_type].add(target)
+        opposite = 'forbidden' if rel_type == 'allowed' else 'allowed'
+        rel[opposite].discard(target)
+
+@app.route('/relations8')
+def all_relations8():
+    """All 8-directional relations in one response."""
+    return jsonify(pack_relations())
+
+@app.route('/relations8/batch', methods=['POST'])
+def batch_relations8():
+    """Apply many relation edits at once.
+    
+    Body: {ops: [{source, target, direction, type, op}]} with op toggle (default),
+    add or remove. Nothing is applied if any op is invalid. Returns the new
+    relations of every source touched.
+    """
+    ops = (request.json or {}).get('ops', [])
+    count = len(state.tile_images)
+    for i, o in enumerate(ops):
+        if o.get('direction') not in DIRECTIONS or o.get('type') not in RELATION_TYPES \
+                or o.get('op', 'toggle') not in ('toggle', 'add', 'remove'):
+            return jsonify({'error': f'Invalid op {i}'}), 400
+        if not all(isinstance(o.get(k), int) and 0 <= o[k] < count for k in ('source', 'target')):
+            return jsonify({'error': f'Tile out of range in op {i}'}), 400
+    for o in ops:
+        apply_relation_op(o['source'], o['target'], o['direction'], o['type'], o.get('op', 'toggle'))
+    return jsonify({'ok': True, 'applied': len(ops),
+                    'relations': {s: relations_of(s) for s in {o['source'] for o in ops}}})
+
 @app.route('/get_relations8/<int:idx>')
 def get_relations8(idx):
     """Get 8-directional relations for a tile."""
-    rel = state.tile_relations[idx]
-    result = {}
-    for direction in DIRECTIONS:
-        dir_rel = rel.get(direction, {"allowed": set(), "forbidden": set()})
-        result[direction] = {
-            'allowed': list(dir_rel.get('allowed', set())),
-            'forbidden': list(dir_rel.get('forbidden', set()))
-        }
-    return jsonify(result)
+    return jsonify(relations_of(idx))
 
 @app.route('/toggle_relation8', methods=['POST'])
 def toggle_relation8():
@@ -1014,15 +1254,7 @@ def toggle_relation8():
     if direction not in DIRECTIONS:
         return jsonify({'error': 'Invalid direction'}), 400
     
-    rel = state.tile_relations[source][direction]
-    if target in rel[rel_type]:
-        rel[rel_type].remove(target)
-    else:
-        rel[rel_type].add(target)
-        # Remove from opposite
-        opposite = 'forbidden' if rel_type == 'allowed' else 'allowed'
-        rel[opposite].discard(target)
-    
+    apply_relation_op(source, target, direction, rel_type)
     return jsonify({'ok': True})
 
 @app.route('/auto_relations8', methods=['POST'])
@@ -1030,7 +1262,7 @@ def auto_relations8():
     """Auto-set relations based on roles for all 8 directions."""
     for i, role_i in enumerate(state.tile_roles):
         # Reset all directions
-        state.tile_relations[i] = {d: {"allowed": set(), "forbidden": set()} for d in DIRECTIONS}
+        state.tile_relations[i] = empty_relations()
         for j, role_j in enumerate(state.tile_roles):
             if role_i == role_j:
                 # Same role tiles can be neighbors in all directions
@@ -1063,13 +1295,7 @@ def toggle_relation():
     rel_type = data['type']
     
     for direction in DIRECTIONS:
-        rel = state.tile_relations[source][direction]
-        if target in rel[rel_type]:
-            rel[rel_type].remove(target)
-        else:
-            rel[rel_type].add(target)
-            opposite = 'forbidden' if rel_type == 'allowed' else 'allowed'
-            rel[opposite].discard(target)
+        apply_relation_op(source, target, direction, rel_type)
     
     return jsonify({'ok': True})
 
@@ -1080,99 +1306,162 @@ def auto_relations():
 @app.route('/clear_relations', methods=['POST'])
 def clear_relations():
     for i in range(len(state.tile_images)):
-        state.tile_relations[i] = {d: {"allowed": set(), "forbidden": set()} for d in DIRECTIONS}
+        state.tile_relations[i] = empty_relations()
     return jsonify({'ok': True})
 
-def wfc_generate():
-    """Wave Function Collapse using 8-directional tile relations."""
-    if not state.tile_images:
-        return
-    
-    height, width = state.map_height, state.map_width
-    possible = [[set(range(len(state.tile_images))) for _ in range(width)] for _ in range(height)]
-    state.map_data = np.full((height, width), -1, dtype=int)
-    state.map_roles = np.full((height, width), "empty", dtype=object)
+def wfc_generate(spec, seed=None, max_depth=64, time_budget=10.0, max_restarts=8, progress=None):
+    """Wave Function Collapse using 8-directional tile relations.
     
-    def get_allowed_for_direction(tile_idx, direction):
-        """Get allowed tiles for a specific direction from this tile."""
-        rel = state.tile_relations[tile_idx]
-        dir_rel = rel.get(direction, {"allowed": set(), "forbidden": set()})
-        allowed = dir_rel.get("allowed", set())
-        forbidden = dir_rel.get("forbidden", set())
-        if allowed:
-            return allowed - forbidden
-        return set(range(len(state.tile_images))) - forbidden
-    
-    # Collapse all cells
-    for _ in range(width * height * 2):
-        min_e, min_cell = float('inf'), None
-        for y in range(height):
-            for x in range(width):
-                if state.map_data[y, x] == -1 and len(possible[y][x]) < min_e:
-                    min_e = len(possible[y][x])
-                    min_cell = (x, y)
-        
-        if min_cell is None:
-            break
-        
-        x, y = min_cell
-        if not possible[y][x]:
-            tile = random.randint(0, len(state.tile_images) - 1)
-        else:
-            tile = random.choice(list(possible[y][x]))
-        
-        state.map_data[y, x] = tile
-        state.map_roles[y, x] = state.tile_roles[tile]
-        
-        # Propagate to all 8 neighbors using directional relations
-        for direction, (dx, dy) in DIR_OFFSETS.items():
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < width and 0 <= ny < height and state.map_data[ny, nx] == -1:
-                allowed = get_allowed_for_direction(tile, direction)
-                possible[ny][nx] &= allowed
-    
-    # Fill remaining
-    for y in range(height):
-        for x in range(width):
-            if state.map_data[y, x] == -1:
-                tile = random.randint(0, len(state.tile_images) - 1)
-                state.map_data[y, x] = tile
-                state.map_roles[y, x] = state.tile_roles[tile]
+    Backtracks and restarts on contradictions; returns the map and the solver report.
+    """
+    return run_generator(MapGenerator.wfc, spec, seed, tile_relations=spec.tile_relations,
+                         max_depth=max_depth, time_budget=time_budget, max_restarts=max_restarts,
+                         progress=progress)
+
+
+PRESETS = {
+    'wfc': (wfc_generate, {'max_depth': 64, 'time_budget': 10.0, 'max_restarts': 8}),
+    'sewer': (generate_bsp, {'min_room': 4, 'max_room': 8, 'corridor': 2}),
+    'office': (generate_bsp, {'min_room': 6, 'max_room': 12, 'corridor': 2}),
+    'caves': (generate_caves, {'fill': 0.48, 'iterations': 5}),
+    'urban': (generate_city, {'block_size': 10, 'street_width': 3, 'jitter': 0, 'alley_chance': 0.0}),
+}
 
+# Largest map side /generate accepts
+MAX_MAP_SIDE = int(os.environ.get('MAPGEN_MAX_MAP_SIDE', 4096))
+# Accepted range of every preset param; request values are converted to the default's type
+PARAM_BOUNDS = {
+    'max_depth': (1, 1024), 'time_budget': (0.1, 60.0), 'max_restarts': (0, 64),
+    'min_room': (2, 256), 'max_room': (2, 256), 'corridor': (1, 16),
+    'fill': (0.0, 1.0), 'iterations': (0, 64),
+    'block_size': (2, 256), 'street_width': (1, 64), 'jitter': (0, 64), 'alley_chance': (0.0, 1.0),
+}
 
+def bounded(name, value, kind, low, high):
+    """`value` converted with kind (int or float) and checked against [low, high]."""
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def tileset_fingerprint(with_relations=False):
+    parts = [len(state.tile_images), state.tile_roles, state.tile_weights]
+    if with_relations:
+        parts.append(relations_fingerprint(state.tile_relations))
+    return fingerprint(*parts)
+
+def generation_job(func, workspace, spec, key, seed, params, progress):
+    """Body of a /generate job: run the generator, cache the map and make it current.
+    
+    The map is only installed while this is still the workspace's current job,
+    so a slow job can't overwrite a newer map or one made for an older tileset.
+    """
+    progress(0, 1, 'starting')
+    game_map, report = func(spec, seed=seed, progress=progress, **params)
+    # A WFC run that failed or ran out of time depends on server load, not just the key
+    if report is None or (report.get('success') and not report.get('timed_out')):
+        generation_cache.put(key, {'data': game_map.data, 'roles': game_map.roles}, {'report': report})
+    with workspace.lock:
+        if workspace.current_job == current_job().id:
+            workspace.map_data, workspace.map_roles = game_map.data, game_map.roles
+            workspace.map_width, workspace.map_height = spec.width, spec.height
+            workspace.update_nbytes()
+    return {'data': game_map.data, 'roles': game_map.roles, 'seed': seed, 'report': report, 'cached': False}
 
 @app.route('/generate', methods=['POST'])
 def generate():
-    data = request.json
-    state.map_width = data.get('width', 30)
-    state.map_height = data.get('height', 20)
+    """Start a generation job and return its id; poll /jobs/<id> for progress and the map."""
+    data = request.get_json(silent=True) or {}
     preset = data.get('preset', 'sewer')
+    if preset not in PRESETS:
+        return jsonify({'error': f'Unknown preset {preset}'}), 400
+    if preset == 'wfc' and len(state.tile_images) == 0:
+        return jsonify({'error': 'Slice tiles first'}), 400
     
-    if preset == 'wfc':
-        wfc_generate()
-    elif preset == 'sewer':
-        generate_bsp(min_room=4, max_room=8, corridor=2)
-    elif preset == 'office':
-        generate_bsp(min_room=6, max_room=12, corridor=2)
-    elif preset == 'caves':
-        generate_caves(fill=0.48, iterations=5)
-    
-    return jsonify({'image': get_map_b64()})
+    func, defaults = PRESETS[preset]
+    try:
+        width = bounded('width', data.get('width', 30), int, 1, MAX_MAP_SIDE)
+        height = bounded('height', data.get('height', 20), int, 1, MAX_MAP_SIDE)
+        seed = data.get('seed')
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2**31))
+        else:
+            seed = bounded('seed', seed, int, 0, 2**63 - 1)
+        # Request fields override the preset's tunable params
+        params = {name: bounded(name, data.get(name, value), type(value), *PARAM_BOUNDS[name])
+                  for name, value in defaults.items()}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    key = GenerationCache.key(preset, params, width, height, seed,
+                              tileset_fingerprint(with_relations=preset == 'wfc'))
+    cached = generation_cache.get(key)
+    if cached is not None:
+        arrays, meta = cached
+        state.map_data = arrays['data'].copy()
+        state.map_roles = arrays['roles'].copy()
+        state.map_width, state.map_height = width, height
+        job = jobs.completed({'data': arrays['data'], 'roles': arrays['roles'], 'seed': seed,
+                              'report': meta.get('report'), 'cached': True})
+    else:
+        job = jobs.submit(generation_job, func, g.workspace, snapshot(width, height), key, seed, params)
+    # The request holds the workspace lock, so the job can't finish before this is set
+    state.current_job = job.id
+    # Keep only ids the queue still remembers
+    state.job_ids = {j for j in state.job_ids if jobs.get(j) is not None} | {job.id}
+    return jsonify({'job': job.id, 'seed': seed, 'status': job.status})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job progress; a finished job also carries the rendered map, seed and report."""
+    job = jobs.get(job_id) if job_id in state.job_ids else None
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    result = job.to_dict()
+    if job.status == DONE:
+        out = job.result
+        result.update(image=render_b64(out['data'], out['roles']), seed=out['seed'], cached=out['cached'])
+        if out['report'] is not None:
+            result['report'] = out['report']
+    return jsonify(result)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id) if job_id in state.job_ids else None
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/export')
 def export():
+    """Download the current map; tile ids are written as cells of the sliced sheet."""
     if state.map_data is None:
         return "No map", 400
     
-    data = {
-        'width': state.map_width,
-        'height': state.map_height,
-        'tiles': state.map_data.tolist(),
-        'roles': state.map_roles.tolist()
-    }
-    buf = io.BytesIO()
-    buf.write(json.dumps(data, indent=2).encode())
-    buf.seek(0)
+    if request.args.get('binary'):
+        # Binary container, see mapgen.binmap
+        buf = io.BytesIO()
+        dump_binary(buf, sheet_tile_ids(state.map_data, state.tile_cells), state.map_roles)
+        buf.seek(0)
+        return send_file(buf, mimetype='application/octet-stream', as_attachment=True, download_name='map.flmap')
+    if request.args.get('compact'):
+        # Version 2 map file, see mapgen.mapformat
+        encoding = request.args.get('encoding', 'rle')
+        if encoding not in ENCODINGS:
+            return f"Unknown encoding {encoding}", 400
+        doc = pack_map(sheet_tile_ids(state.map_data, state.tile_cells), state.map_roles, encoding, bool(request.args.get('zlib')))
+        text = json.dumps(doc, separators=(',', ':'))
+    else:
+        data = {
+            'width': state.map_width,
+            'height': state.map_height,
+            'tiles': sheet_tile_ids(state.map_data, state.tile_cells).tolist(),
+            'roles': names_from_codes(state.map_roles)
+        }
+        text = json.dumps(data, indent=2)
+    buf = io.BytesIO(text.encode())
     return send_file(buf, mimetype='application/json', as_attachment=True, download_name='map.json')
 
 if __name__ == '__main__':
@@ -1,9 +1,30 @@
 """
-Converts map.json to Godot TileMap tile_data and updates level_1.tscn
+Converts map.json files to Godot TileMap tile_data and updates level scenes
 This embeds the tiles directly in the scene file for editor editing.
+
+    python map_to_godot.py conversions.json [--force]
+
+Each (map, scene, node, layer) pair in the config is converted only when its
+map, settings or scene changed since the last run, per a content-hash manifest.
 """
+import argparse
+import hashlib
 import json
+import os
 import re
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_generator"))
+from mapgen.binmap import is_binary_map, open_binary
+from mapgen.godot import format_int_list
+from mapgen.mapformat import load_map
+
+HASH_BLOCK = 1 << 20      # Read size when hashing inputs
+
 
 def encode_tile_data(x: int, y: int, source_id: int, atlas_x: int, atlas_y: int) -> list[int]:
     """
@@ -35,82 +56,282 @@ def convert_tile_index_to_atlas(tile_index: int, columns: int = 16) -> tuple[int
 
 
 def load_map_json(filepath: str) -> dict:
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Load a map in the nested-list, compact (version 2) or binary container format.
+    
+    `tiles` comes back as a (height, width) int32 array and `roles` as uint8 role codes;
+    for binary containers both are memmaps, so nothing is read until used.
+    """
+    if is_binary_map(filepath):
+        container = open_binary(filepath)
+        return {**container.meta, "width": container.width, "height": container.height,
+                "tiles": container.tiles, "roles": container.roles}
+    return load_map(filepath)
 
 
-def generate_tile_data(map_data: dict, tileset_columns: int = 16) -> list[int]:
-    """Generate PackedInt32Array data from map.json"""
-    tiles = map_data.get('tiles', [])
-    tile_data = []
+def generate_tile_data(map_data: dict, tileset_columns: int = 16,
+                       region: tuple[int, int, int, int] | None = None, source_id: int = 0) -> np.ndarray:
+    """Generate PackedInt32Array data from map.json
     
-    for y, row in enumerate(tiles):
-        for x, tile_index in enumerate(row):
-            if tile_index >= 0:  # Skip invalid tiles
-                atlas_x, atlas_y = convert_tile_index_to_atlas(tile_index, tileset_columns)
-                encoded = encode_tile_data(x, y, 0, atlas_x, atlas_y)
-                tile_data.extend(encoded)
+    Vectorized encode_tile_data over every cell with tile_index >= 0; returns a
+    flat int32 array of [cell_coords, source, atlas] triples in row-major order.
+    `region` (x, y, width, height) limits conversion to a rectangle; cells keep
+    their map coordinates, and only that part of a memmapped map is read.
+    """
+    tiles = np.asarray(map_data.get('tiles', []), dtype=np.int32)
+    if tiles.ndim != 2:
+        return np.empty(0, dtype=np.int32)
+    x0 = y0 = 0
+    if region is not None:
+        x0, y0, w, h = region
+        tiles = tiles[y0:y0 + h, x0:x0 + w]
+    
+    ys, xs = np.nonzero(tiles >= 0)  # Skip invalid tiles
+    index = tiles[ys, xs].astype(np.int64)
+    ys = ys.astype(np.int64) + y0
+    xs = xs.astype(np.int64) + x0
     
-    return tile_data
+    tile_data = np.empty((len(index), 3), dtype=np.int64)
+    tile_data[:, 0] = (ys << 16) | (xs & 0xFFFF)
+    tile_data[:, 1] = source_id
+    tile_data[:, 2] = ((index // tileset_columns) << 16) | ((index % tileset_columns) & 0xFFFF)
+    # Godot stores the words as int32; wrap like PackedInt32Array does
+    return tile_data.astype(np.int32).ravel()
 
 
-def format_packed_int32_array(data: list[int]) -> str:
+def format_packed_int32_array(data) -> str:
     """Format as Godot PackedInt32Array string"""
-    return f"PackedInt32Array({', '.join(str(x) for x in data)})"
+    return f"PackedInt32Array({format_int_list(data)})"
 
 
-def update_tscn_file(tscn_path: str, tile_data_str: str):
-    """Update the level_1.tscn file with the tile data"""
-    with open(tscn_path, 'r') as f:
-        content = f.read()
-    
-    # Check if layer_0/tile_data already exists
-    if 'layer_0/tile_data' in content:
-        # Replace existing tile_data
-        content = re.sub(
-            r'layer_0/tile_data = PackedInt32Array\([^)]*\)',
-            f'layer_0/tile_data = {tile_data_str}',
-            content
-        )
-    else:
-        # Add tile_data after format = 2
-        content = content.replace(
-            'format = 2',
-            f'format = 2\nlayer_0/tile_data = {tile_data_str}'
-        )
-    
-    with open(tscn_path, 'w') as f:
-        f.write(content)
+_SECTION = re.compile(r'^\[(\w+)(.*)\]\s*$')
+_ATTR = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|[^\s\]]+)')
+_TILE_DATA = re.compile(r'^layer_(\d+)/tile_data\s*=')
+_LAYER_PROP = re.compile(r'^layer_(\d+)/')
+
+
+def _node_path(attrs: dict) -> str:
+    """Scene path of a [node] section: "." for the root, else parent/name."""
+    name = attrs.get('name', '')
+    parent = attrs.get('parent')
+    if parent is None:
+        return '.'
+    return name if parent == '.' else f"{parent}/{name}"
+
+
+def _line_end(line: str) -> str:
+    return line[len(line.rstrip('\r\n')):]
+
+
+def _flush_section(lines: list[str], pending: dict[int, str], out) -> None:
+    """Write a buffered target node section, adding tile_data for layers it lacked.
+    
+    A missing layer goes after the last property of that layer or a lower one,
+    else after `format = 2`, else at the end of the section.
+    """
+    newline = _line_end(lines[0]) or '\n'
+    for layer, text in sorted(pending.items()):
+        at = None
+        for i, line in enumerate(lines):
+            m = _LAYER_PROP.match(line)
+            if m and int(m.group(1)) <= layer:
+                at = i + 1
+        if at is None:
+            at = next((i + 1 for i, line in enumerate(lines) if line.startswith('format = 2')), None)
+        if at is None:
+            at = len(lines)
+            while at > 1 and not lines[at - 1].strip():
+                at -= 1
+        lines.insert(at, f"layer_{layer}/tile_data = {text}{newline}")
+    out.writelines(lines)
+
+
+def rewrite_tscn(tscn_path: str, updates: dict[tuple[str | None, int], str], out_path: str | None = None) -> None:
+    """Splice tile_data into a scene in one streaming pass.
+    
+    `updates` maps (node path, layer) to a formatted PackedInt32Array string. Node
+    paths are relative to the scene root ("TileMap", "TileMap/Walls"); None means
+    the first TileMap node. Only the target nodes' sections are buffered, the rest
+    is copied line by line, and the result replaces `out_path` (default: the
+    input) through a temp file and an atomic rename.
+    """
+    out_path = out_path or tscn_path
+    wanted: dict[str | None, dict[int, str]] = {}
+    for (node, layer), text in updates.items():
+        wanted.setdefault(node, {})[layer] = text
     
+    fd, tmp = tempfile.mkstemp(prefix='.tscn-', dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        with open(tscn_path, 'r', newline='') as src, os.fdopen(fd, 'w', newline='') as out:
+            section = None      # Buffered lines of the current target node
+            pending = {}        # Its layers still waiting for tile_data
+            skipping = False    # Inside a replaced value that spans several lines
+            for line in src:
+                if skipping:
+                    skipping = not line.rstrip().endswith(')')
+                    continue
+                header = _SECTION.match(line)
+                if header:
+                    if section is not None:
+                        _flush_section(section, pending, out)
+                        section = None
+                    if header.group(1) == 'node':
+                        attrs = {k: v.strip('"') for k, v in _ATTR.findall(header.group(2))}
+                        path = _node_path(attrs)
+                        if None in wanted and attrs.get('type') == 'TileMap':
+                            wanted[path] = {**wanted.pop(None), **wanted.get(path, {})}
+                        if path in wanted:
+                            pending = wanted.pop(path)
+                            section = [line]
+                            continue
+                    out.write(line)
+                elif section is None:
+                    out.write(line)
+                else:
+                    m = _TILE_DATA.match(line)
+                    if m and int(m.group(1)) in pending:
+                        layer = int(m.group(1))
+                        section.append(f"layer_{layer}/tile_data = {pending.pop(layer)}{_line_end(line)}")
+                        skipping = not line.rstrip().endswith(')')
+                    else:
+                        section.append(line)
+            if section is not None:
+                _flush_section(section, pending, out)
+        if wanted:
+            missing = ', '.join(node or 'TileMap' for node in wanted)
+            raise KeyError(f"No node {missing} in {tscn_path}")
+        if os.path.exists(out_path):
+            shutil.copymode(out_path, tmp)
+        os.replace(tmp, out_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def update_tscn_file(tscn_path: str, tile_data_str: str, node: str | None = None, layer: int = 0):
+    """Update the level_1.tscn file with the tile data"""
+    rewrite_tscn(tscn_path, {(node, layer): tile_data_str})
     print(f"Updated {tscn_path} with tile data")
 
 
-def main():
-    # Paths
-    map_json_path = r"d:\Programming Languages\first attempt\asset\map.json"
-    tscn_path = r"d:\Programming Languages\first attempt\levels\level_1.tscn"
+def file_digest(path: str, cached: dict | None = None) -> dict:
+    """Content hash of a file as {size, mtime_ns, sha256}.
     
-    # Load map data
-    print("Loading map.json...")
-    map_data = load_map_json(map_json_path)
+    When `cached` has the same size and mtime the file is not re-read.
+    """
+    st = os.stat(path)
+    if cached and cached.get('size') == st.st_size and cached.get('mtime_ns') == st.st_mtime_ns:
+        return cached
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': h.hexdigest()}
+
+
+def load_config(config_path: str) -> list[dict]:
+    """Conversion pairs from a JSON config, paths resolved against the config's folder.
     
-    width = map_data.get('width', 0)
-    height = map_data.get('height', 0)
-    print(f"Map size: {width}x{height}")
+        {"columns": 16,
+         "conversions": [{"map": "../asset/map.json", "scene": "../levels/level_1.tscn",
+                          "node": "TileMap", "layer": 0}]}
     
-    # Generate tile data (16 columns for sewer_1.png tileset)
-    print("Generating tile data...")
-    tile_data = generate_tile_data(map_data, tileset_columns=16)
-    print(f"Generated {len(tile_data) // 3} tiles")
+    `columns` and `source_id` may be set at the top level or per pair.
+    """
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(config_path))
+    pairs = []
+    for entry in config.get('conversions', []):
+        pairs.append({
+            'map': os.path.normpath(os.path.join(base, entry['map'])),
+            'scene': os.path.normpath(os.path.join(base, entry['scene'])),
+            'node': entry.get('node'),
+            'layer': int(entry.get('layer', 0)),
+            'columns': int(entry.get('columns', config.get('columns', 16))),
+            'source_id': int(entry.get('source_id', config.get('source_id', 0))),
+        })
+    return pairs
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    fd, tmp = tempfile.mkstemp(prefix='.manifest-', dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _target_key(pair: dict) -> str:
+    return f"{pair['node'] or ''}:{pair['layer']}"
+
+
+def convert(pairs: list[dict], manifest: dict, force: bool = False) -> tuple[int, int]:
+    """Convert every out-of-date pair, updating `manifest` in place.
     
-    # Format as PackedInt32Array
-    tile_data_str = format_packed_int32_array(tile_data)
+    The manifest records, per scene, the scene's hash after the last write and
+    for each (node, layer) target the hash of its map and its settings. A target
+    is rebuilt when its map or settings changed, and every target of a scene is
+    rebuilt when the scene changed since it was written. Each scene is rewritten
+    in a single pass. Returns (targets converted, targets skipped).
+    """
+    scenes: dict[str, list[dict]] = {}
+    for pair in pairs:
+        scenes.setdefault(pair['scene'], []).append(pair)
+    
+    converted = skipped = 0
+    for scene, targets in scenes.items():
+        record = manifest.get(scene, {})
+        known = record.get('targets', {})
+        scene_digest = file_digest(scene, record.get('scene'))
+        scene_changed = force or scene_digest.get('sha256') != record.get('scene', {}).get('sha256')
+    
+        updates = {}
+        entries = {}
+        for pair in targets:
+            key = _target_key(pair)
+            old = known.get(key, {})
+            map_digest = file_digest(pair['map'], old.get('map'))
+            settings = {'columns': pair['columns'], 'source_id': pair['source_id']}
+            entries[key] = {'map_path': pair['map'], 'map': map_digest, **settings}
+            if not scene_changed and old.get('map', {}).get('sha256') == map_digest['sha256'] \
+                    and all(old.get(k) == v for k, v in settings.items()):
+                skipped += 1
+                continue
+            map_data = load_map_json(pair['map'])
+            tile_data = generate_tile_data(map_data, pair['columns'], source_id=pair['source_id'])
+            updates[(pair['node'], pair['layer'])] = format_packed_int32_array(tile_data)
+    
+        if updates:
+            rewrite_tscn(scene, updates)
+            converted += len(updates)
+            print(f"Updated {scene} ({len(updates)} layer{'s' if len(updates) != 1 else ''})")
+            scene_digest = file_digest(scene)
+        manifest[scene] = {'scene': scene_digest, 'targets': entries}
+    return converted, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed map files into Godot scenes as TileMap tile_data.")
+    parser.add_argument('config', help="JSON config of (map, scene, node, layer) conversions")
+    parser.add_argument('--manifest', help="Content-hash manifest (default: next to the config)")
+    parser.add_argument('--force', action='store_true', help="Convert every pair even if up to date")
+    args = parser.parse_args(argv)
     
-    # Update the .tscn file
-    print("Updating level_1.tscn...")
-    update_tscn_file(tscn_path, tile_data_str)
+    manifest_path = args.manifest or os.path.splitext(args.config)[0] + '.manifest.json'
+    pairs = load_config(args.config)
+    manifest = load_manifest(manifest_path)
+    converted, skipped = convert(pairs, manifest, force=args.force)
+    save_manifest(manifest_path, manifest)
     
-    print("Done! Reload the scene in Godot to see the tiles.")
+    print(f"Done: {converted} converted, {skipped} up to date.")
+    if converted:
+        print("Reload the scenes in Godot to see the tiles.")
 
 
 if __name__ == "__main__":